@@ -70,6 +70,8 @@ const MoodIndex = () => {
   const [input, setInput] = useState('');
   const [loading, setLoading] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  // per-tab chat session; the backend only keeps history for unguessable session ids
+  const sessionIdRef = useRef<string>(crypto.randomUUID());
 
   useEffect(() => {
     const lastMessage = messages[messages.length - 1];
@@ -105,7 +107,7 @@ const MoodIndex = () => {
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
           message: currentInput,
-          session_id: 'mood_chat_session'
+          session_id: sessionIdRef.current
         })
       });
   
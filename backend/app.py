@@ -1,13 +1,86 @@
-from fastapi import FastAPI, Request, UploadFile, File
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse
 from datetime import date
 import json
 import os
-from typing import List
-import requests
+import uuid
+from typing import List, Optional
 import asyncio
 
-app = FastAPI()
+from auth import verify_jwt_token
+from core.analytics import score_checkin, score_checkins_batch, StreamingStats
+from core.exercise_catalogue import get_catalogue
+from db import init_db, close_db, is_db_ready, upsert_checkin_safe, bulk_upsert_checkins, get_trend_state, save_trend_state, get_user_mood_series
+from logger.custom_logger import CustomLogger
+from utils.gemini_client import GeminiClient, GeminiAPIError
+from utils.llm_cache import LLMResponseCache, MongoCacheBackend, make_cache_key
+from utils.singleflight import SingleFlight
+from utils.session_store import build_session_store
+
+_LOG = CustomLogger().get_logger(__name__)
+
+# Shared, pooled Gemini client (one connection pool per worker)
+gemini_client = GeminiClient.from_env()
+GEMINI_API_KEY = gemini_client.api_key
+
+# Content-addressed response cache; LLM_CACHE_BACKEND=mongo adds a tier shared by all workers
+llm_cache = LLMResponseCache(
+    maxsize=int(os.getenv("LLM_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("LLM_CACHE_TTL", "3600")),
+    shared=MongoCacheBackend() if os.getenv("LLM_CACHE_BACKEND", "").lower() == "mongo" else None,
+)
+
+# Identical concurrent prompts share one upstream Gemini call
+gemini_flights = SingleFlight()
+
+# Offline-built exercise catalogue (python -m core.exercise_catalogue); empty if not built yet
+exercise_catalogue = get_catalogue()
+
+
+async def _connect_db_with_retry():
+    """Bring the database up in the background; /ready reports 503 until it is."""
+    delay = 1.0
+    while True:
+        try:
+            await init_db()
+            return
+        except Exception as e:
+            _LOG.warning("Database not ready yet; retrying", error=str(e), retry_in=delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+
+RAG_FAISS_DIR = os.getenv("RAG_FAISS_DIR", "rag/vectorstore")
+
+
+async def _warm_retriever():
+    """Load the RAG vector store once at startup so no request pays the index-load cost."""
+    if not os.path.isdir(RAG_FAISS_DIR):
+        return
+    try:
+        from rag.vectorstore_registry import vectorstore_registry
+        from utils.model_loader import ModelLoader
+        await asyncio.to_thread(
+            vectorstore_registry.get, RAG_FAISS_DIR, lambda: ModelLoader().load_embeddings()
+        )
+    except Exception as e:
+        _LOG.warning("RAG vector store warm-up skipped", error=str(e))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    db_task = asyncio.create_task(_connect_db_with_retry())
+    warm_task = asyncio.create_task(_warm_retriever())
+    yield
+    db_task.cancel()
+    warm_task.cancel()
+    await gemini_client.aclose()
+    await close_db()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,37 +90,50 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Get Gemini API Key from environment
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
-GEMINI_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
-
-async def call_gemini(prompt: str):
+async def call_gemini(prompt: str, generation_config: dict = None, use_cache: bool = True):
     """Call Gemini API for real AI responses"""
-    if not GEMINI_API_KEY:
+    if not gemini_client.enabled:
         return "Mock response: I'm here to help you with your emotional wellness journey."
     
+    cache_key = make_cache_key(gemini_client.model, prompt, generation_config)
+    if use_cache:
+        cached = await llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    
+    async def _generate():
+        text = await gemini_client.generate(prompt, generation_config)
+        # only real completions are cached, never the fallback strings below
+        if use_cache:
+            await llm_cache.set(cache_key, text)
+        return text
+    
     try:
-        payload = {
-            "contents": [{"parts": [{"text": prompt}]}]
-        }
-        
-        response = requests.post(
-            f"{GEMINI_URL}?key={GEMINI_API_KEY}",
-            json=payload,
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            return data["candidates"][0]["content"]["parts"][0]["text"]
-        else:
-            return "I'm here to support you. How are you feeling right now?"
+        return await gemini_flights.do(cache_key, _generate)
+    except GeminiAPIError:
+        return "I'm here to support you. How are you feeling right now?"
     except Exception as e:
         return "I understand you're reaching out. What's on your mind today?"
 
 @app.get("/health")
 async def health():
-    return {"status": "ok", "retriever_ready": True, "ai_enabled": bool(GEMINI_API_KEY)}
+    return {
+        "status": "ok",
+        "retriever_ready": True,
+        "ai_enabled": bool(GEMINI_API_KEY),
+        "db_ready": is_db_ready(),
+        "llm_cache": llm_cache.stats(),
+        "llm_coalescing": gemini_flights.stats(),
+        "chat_sessions": session_store.stats(),
+        "exercise_catalogue": exercise_catalogue.stats()
+    }
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 until the database has been reached and indexed."""
+    if not is_db_ready():
+        return JSONResponse(status_code=503, content={"status": "starting", "db_ready": False})
+    return {"status": "ready", "db_ready": True}
 
 @app.get("/analytics/checkin/questions")
 async def get_questions():
@@ -61,22 +147,112 @@ async def get_questions():
         ]
     }
 
+TREND_SAVE_RETRIES = 5
+
+
+async def update_user_trend(user_id: str, points: List[tuple]) -> dict:
+    """
+    Fold new (date, mood_index) points into the user's stored running state,
+    O(1) per point. Re-submitting only the latest day is folded into the saved
+    previous state instead; a user without saved state yet, or any out-of-order
+    (backfilled) day, rebuilds the state from the stored history once.
+    The state is saved with a version check; when a concurrent check-in for the
+    same user wins the race, the fold is redone on top of its state.
+    """
+    points = sorted(dict(points).items())
+    first_day = points[0][0]
+    
+    for _ in range(TREND_SAVE_RETRIES):
+        doc = await get_trend_state(user_id) or {}
+        last_date = doc.get("last_date")
+        
+        if last_date is not None and first_day > last_date:
+            stats, prev = StreamingStats.from_dict(doc.get("state")), doc.get("state")
+            for _, mood_index in points:
+                prev = stats.to_dict()
+                stats.update(mood_index)
+            day = points[-1][0]
+        elif last_date is not None and len(points) == 1 and first_day == last_date:
+            prev = doc.get("prev")
+            stats = StreamingStats.from_dict(prev).update(points[0][1])
+            day = last_date
+        else:
+            # newest first from the covering index; fold oldest first
+            history = (await get_user_mood_series(user_id, days=None))[::-1]
+            if not history:
+                # checkins not persisted (database offline): fold what we were given
+                history = [{"date": d, "mood_index": m} for d, m in points]
+            stats, prev = StreamingStats(), None
+            for row in history:
+                prev = stats.to_dict()
+                stats.update(row["mood_index"])
+            day = max(last_date or "", history[-1]["date"])
+        
+        saved = await save_trend_state(
+            user_id, {"state": stats.to_dict(), "prev": prev, "last_date": day}, doc.get("v", 0)
+        )
+        if saved is not None:
+            return stats.stats()
+    
+    raise RuntimeError(f"Trend state for {user_id} kept changing; gave up after {TREND_SAVE_RETRIES} attempts")
+
 @app.post("/analytics/checkin")
 async def submit_checkin(request: Request):
     data = await request.json()
-    responses = {k: v for k, v in data.items() if k not in ["user_id", "date"]}
-    values = list(responses.values())
-    avg = sum(values) / len(values) if values else 3
-    mood_index = ((avg - 1) / 4) * 100
+    checkin = score_checkin(data)
+    checkin["user_id"] = data.get("user_id", "anonymous")
+    checkin["date"] = data.get("date") or date.today().isoformat()
+    
+    await upsert_checkin_safe(checkin)
+    try:
+        stats = await update_user_trend(checkin["user_id"], [(checkin["date"], checkin["mood_index"])])
+    except Exception as e:
+        _LOG.error("Trend state update failed; using single-point stats", error=str(e))
+        stats = StreamingStats().update(checkin["mood_index"]).stats()
     
     return {
-        "mood_index": round(mood_index, 2),
-        "ema7": round(mood_index, 2),
-        "ema14": round(mood_index, 2),
-        "zscore": 0.0,
-        "flag": "SAFE"
+        "mood_index": checkin["mood_index"],
+        "ema7": stats["ema7"],
+        "ema14": stats["ema14"],
+        "zscore": stats["zscore"],
+        "flag": stats["flag"]
     }
 
+@app.post("/analytics/checkin/bulk")
+async def submit_checkins_bulk(request: Request):
+    """
+    Score and store many check-ins at once (history imports, offline sync).
+    Body: {"checkins": [{user_id, date, mood, stress, energy, connection, motivation}, ...]}
+    """
+    data = await request.json()
+    rows = data.get("checkins", [])
+    if not rows:
+        return {"count": 0, "mood_indices": [], "write": None}
+    
+    mood_indices = score_checkins_batch(rows).tolist()
+    today = date.today().isoformat()
+    checkins = []
+    per_user = {}
+    for row, mood_index in zip(rows, mood_indices):
+        doc = {**row, "user_id": row.get("user_id", "anonymous"), "date": row.get("date") or today, "mood_index": mood_index}
+        checkins.append(doc)
+        per_user.setdefault(doc["user_id"], []).append((doc["date"], mood_index))
+    
+    try:
+        write = await bulk_upsert_checkins(checkins)
+    except Exception as e:
+        _LOG.error("Bulk checkin write failed", error=str(e), count=len(checkins))
+        return {"count": len(checkins), "mood_indices": mood_indices, "write": None}
+    
+    flags = {}
+    for user_id, points in per_user.items():
+        try:
+            flags[user_id] = (await update_user_trend(user_id, points))["flag"]
+        except Exception as e:
+            _LOG.error("Trend state update failed", error=str(e), user_id=user_id)
+    
+    return {"count": len(checkins), "mood_indices": mood_indices, "write": write, "flags": flags}
+
 @app.post("/ai/analyze-entry")
 async def analyze_entry(request: Request):
     data = await request.json()
@@ -143,7 +319,61 @@ async def analyze_entry(request: Request):
     }
 
 # REAL-TIME CHATBOT
-chat_sessions = {}
+# SESSION_STORE=mongo shares chat history between workers; default is a bounded in-process LRU
+session_store = build_session_store(
+    os.getenv("SESSION_STORE", "memory").lower(),
+    ttl=float(os.getenv("SESSION_TTL", "3600")),
+    token_budget=int(os.getenv("SESSION_TOKEN_BUDGET", "1000")),
+)
+
+CRISIS_KEYWORDS = ["die", "kill", "hurt", "suicide"]
+CRISIS_RESPONSE = "I'm concerned about what you're sharing. Please reach out to someone you trust or contact a crisis helpline. You matter and support is available."
+
+
+def is_crisis_message(message: str) -> bool:
+    """Keyword safety short-circuit applied before any LLM call."""
+    return any(word in message.lower() for word in CRISIS_KEYWORDS)
+
+
+def build_chat_prompt(message: str, history: List[dict] = None) -> str:
+    conversation = "\n".join(f"    {t['role']}: {t['content']}" for t in (history or []))
+    if conversation:
+        conversation = f"Conversation so far:\n{conversation}\n"
+    return f"""
+    You are an empathetic emotional wellness coach. Respond to this message with care and understanding.
+    Keep responses under 50 words. Be supportive but not clinical.
+    {conversation}
+    User message: "{message}"
+    
+    Response:
+    """
+
+
+def chat_session_key(request: Request, session_id: Optional[str]) -> Optional[str]:
+    """
+    Private history key for this caller, or None when history must not be used.
+    Authenticated callers are keyed by their user id (plus the optional session id);
+    anonymous callers need a client-generated UUID session id. There is no shared
+    fallback bucket.
+    """
+    session_id = str(session_id or "").strip()
+    auth_header = request.headers.get("authorization", "")
+    if auth_header.lower().startswith("bearer "):
+        try:
+            user_id = verify_jwt_token(auth_header[7:].strip()).get("sub")
+        except HTTPException:
+            user_id = None  # expired/malformed token: chat never required auth, treat as anonymous
+        if user_id:
+            return f"user:{user_id}:{session_id}"
+    try:
+        return f"anon:{uuid.UUID(session_id)}"
+    except ValueError:
+        return None
+
+
+def _sse(payload: dict, event: str = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(payload)}\n\n"
 
 # Add this to your backend/app.py if it's not there:
 
@@ -151,30 +381,82 @@ chat_sessions = {}
 async def chat_mood(request: Request):
     data = await request.json()
     message = data.get("message", "")
+    session_id = data.get("session_id")
     
     # Safety check first
-    if any(word in message.lower() for word in ["die", "kill", "hurt", "suicide"]):
+    if is_crisis_message(message):
         return {
-            "response": "I'm concerned about what you're sharing. Please reach out to someone you trust or contact a crisis helpline. You matter and support is available.",
-            "session_id": data.get("session_id", "default")
+            "response": CRISIS_RESPONSE,
+            "session_id": session_id
         }
     
-    # Real AI chat response
-    chat_prompt = f"""
-    You are an empathetic emotional wellness coach. Respond to this message with care and understanding.
-    Keep responses under 50 words. Be supportive but not clinical.
-    
-    User message: "{message}"
+    # Real AI chat response; history only for a session private to this caller
+    session_key = chat_session_key(request, session_id)
+    history = await session_store.get_history(session_key) if session_key else []
+    response = (await call_gemini(build_chat_prompt(message, history))).strip()
+    if session_key:
+        await session_store.append(
+            session_key,
+            {"role": "user", "content": message},
+            {"role": "assistant", "content": response}
+        )
     
-    Response:
+    return {
+        "response": response,
+        "session_id": session_id
+    }
+
+@app.post("/chat/mood/stream")
+async def chat_mood_stream(request: Request):
+    """
+    Streaming variant of /chat/mood (Server-Sent Events).
+    Emits `data: {"token": ...}` events as Gemini produces text, then an
+    `event: done` carrying the full response.
     """
+    data = await request.json()
+    message = data.get("message", "")
+    session_id = data.get("session_id")
+    session_key = chat_session_key(request, session_id)
     
-    response = await call_gemini(chat_prompt)
+    async def events():
+        # Safety check first - never reaches the LLM
+        if is_crisis_message(message):
+            yield _sse({"token": CRISIS_RESPONSE})
+            yield _sse({"response": CRISIS_RESPONSE, "session_id": session_id}, event="done")
+            return
+        
+        history = await session_store.get_history(session_key) if session_key else []
+        prompt = build_chat_prompt(message, history)
+        
+        parts = []
+        if not gemini_client.enabled:
+            parts.append(await call_gemini(prompt))
+            yield _sse({"token": parts[0]})
+        else:
+            try:
+                async for token in gemini_client.stream_generate(prompt):
+                    parts.append(token)
+                    yield _sse({"token": token})
+            except Exception:
+                if not parts:
+                    fallback = "I understand you're reaching out. What's on your mind today?"
+                    parts.append(fallback)
+                    yield _sse({"token": fallback})
+        
+        response = "".join(parts).strip()
+        if session_key:
+            await session_store.append(
+                session_key,
+                {"role": "user", "content": message},
+                {"role": "assistant", "content": response}
+            )
+        yield _sse({"response": response, "session_id": session_id}, event="done")
     
-    return {
-        "response": response.strip(),
-        "session_id": data.get("session_id", "default")
-    }
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/ai/get-baseline-questions")
 async def baseline_questions():
@@ -222,6 +504,13 @@ async def get_exercise(request: Request):
     data = await request.json()
     target_facets = data.get("target_facets", [])
     
+    # Precomputed catalogue first: no LLM call for the common facet/emotion/duration grid
+    cached_exercise = exercise_catalogue.lookup(
+        target_facets, data.get("context_tags", []), data.get("duration_hint", "2min")
+    )
+    if cached_exercise is not None:
+        return {"exercise": cached_exercise}
+    
     # Real AI exercise generation
     exercise_prompt = f"""
     Create a personalized emotional intelligence exercise. Respond in JSON format:
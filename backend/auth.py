@@ -1,4 +1,6 @@
 import os
+import time
+import hashlib
 import jwt
 from datetime import datetime, timedelta, timezone
 from typing import Optional, List
@@ -8,8 +10,9 @@ from authlib.integrations.starlette_client import OAuth
 from starlette.requests import Request
 from starlette.responses import RedirectResponse
 
-from db import find_user_by_email, Collections
+from db import find_user_by_email, Collections, AUTH_USER_PROJECTION
 from logger.custom_logger import CustomLogger
+from utils.ttl_cache import TTLCache
 
 _LOG = CustomLogger().get_logger(__name__)
 
@@ -24,6 +27,14 @@ GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 OAUTH_CALLBACK_URL = os.getenv("OAUTH_CALLBACK_URL", "http://localhost:8000/auth/google/callback")
 
+# Per-process cache of authenticated users keyed by JWT `sub`; kept short-lived and
+# invalidated explicitly on profile / role updates
+USER_CACHE_TTL_SECONDS = float(os.getenv("AUTH_USER_CACHE_TTL", "30"))
+_user_cache = TTLCache(maxsize=int(os.getenv("AUTH_USER_CACHE_SIZE", "10000")), ttl=USER_CACHE_TTL_SECONDS)
+
+# Already-verified tokens keyed by sha256(token); entries never outlive the token's `exp`
+_verified_tokens = TTLCache(maxsize=int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "50000")), ttl=300.0)
+
 # Security scheme for FastAPI
 security = HTTPBearer()
 
@@ -56,10 +67,24 @@ def create_jwt_token(user_data: dict) -> str:
 
 
 def verify_jwt_token(token: str) -> dict:
-    """Verify and decode JWT token."""
+    """
+    Verify and decode JWT token.
+    Signature verification runs once per token per process; repeat presentations
+    are served from a digest-keyed cache until the token's `exp`.
+    """
+    digest = hashlib.sha256(token.encode("utf-8")).digest()
+    cached = _verified_tokens.get(digest)
+    if cached is not None:
+        if cached.get("exp", 0) > time.time():
+            return dict(cached)
+        _verified_tokens.pop(digest)
+    
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
+        remaining = payload.get("exp", 0) - time.time()
+        if remaining > 0:
+            _verified_tokens.set(digest, payload, ttl=min(remaining, _verified_tokens.ttl))
+        return dict(payload)
     except jwt.ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -77,15 +102,25 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     token = credentials.credentials
     payload = verify_jwt_token(token)
     
-    # Get fresh user data from database
-    user = await find_user_by_email(payload.get("email"))
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found"
-        )
+    # Serve from the short-lived user cache, else fetch fresh user data from database
+    cache_key = str(payload.get("sub"))
+    user = _user_cache.get(cache_key)
+    if user is None:
+        user = await find_user_by_email(payload.get("email"), AUTH_USER_PROJECTION)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found"
+            )
+        _user_cache.set(cache_key, user)
     
-    return user
+    # shallow copy so request handlers cannot mutate the cached document
+    return dict(user)
+
+
+def invalidate_cached_user(user_id) -> None:
+    """Drop a user from the authenticated-user cache (call after any profile or role change)."""
+    _user_cache.pop(str(user_id))
 
 
 def ensure_role(allowed_roles: List[str]):
@@ -236,6 +271,26 @@ async def update_user_profile(user_id: str, updates: dict) -> dict:
     if safe_updates:
         safe_updates["updated_at"] = datetime.utcnow()
         await users.update_one({"_id": user_id}, {"$set": safe_updates})
+        invalidate_cached_user(user_id)
+    
+    return await users.find_one({"_id": user_id})
+
+
+async def update_user_role(user_id: str, role: str, team_id: Optional[str] = None) -> dict:
+    """Change a user's role (and optionally team) and drop them from the user cache."""
+    allowed_roles = ["individual", "mentor", "counselor", "coordinator"]
+    if role not in allowed_roles:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown role: {role}"
+        )
+    
+    users = await Collections.users()
+    updates = {"role": role, "updated_at": datetime.utcnow()}
+    if team_id is not None:
+        updates["team_id"] = team_id
+    await users.update_one({"_id": user_id}, {"$set": updates})
+    invalidate_cached_user(user_id)
     
     return await users.find_one({"_id": user_id})
 
@@ -250,4 +305,19 @@ def validate_team_access(user: dict, target_team_id: str) -> bool:
         return True
     
     # Others can only access their own team
-    return user_team == target_team_id
\ No newline at end of file
+    return user_team == target_team_id
+
+
+if __name__ == "__main__":
+    # Micro-benchmark: per-request auth overhead with and without the verified-token cache
+    import timeit
+    
+    token = create_jwt_token({"_id": "bench_user", "email": "bench@example.com"})
+    runs = 20000
+    
+    uncached = timeit.timeit(lambda: jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM]), number=runs)
+    verify_jwt_token(token)  # warm the cache
+    cached = timeit.timeit(lambda: verify_jwt_token(token), number=runs)
+    
+    print(f"jwt.decode (HMAC verify every call): {uncached / runs * 1e6:.2f} us/request")
+    print(f"verify_jwt_token (cached):           {cached / runs * 1e6:.2f} us/request")
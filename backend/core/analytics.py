@@ -1,7 +1,10 @@
 import json
 import math
+from collections import deque
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable
+
+import numpy as np
 
 
 def likert_questions() -> List[Dict[str, Any]]:
@@ -62,6 +65,43 @@ def score_checkin(payload: Dict[str, Any]) -> Dict[str, Any]:
     return result
 
 
+_LIKERT_FIELDS = ("mood", "stress", "energy", "connection", "motivation")
+
+
+def score_checkins_batch(checkins: Any) -> np.ndarray:
+    """
+    Vectorised score_checkin() for many check-ins at once.
+    Accepts either columnar data ({"mood": [...], "stress": [...], ...}) or an
+    iterable of payload dicts; missing answers default to 3 like score_checkin().
+    Returns a float array of MoodIndex values (0-100, rounded to 2 dp).
+    """
+    if isinstance(checkins, dict):
+        lengths = {len(v) for v in checkins.values() if v is not None}
+        size = lengths.pop() if len(lengths) == 1 else None
+        if size is None:
+            raise ValueError("columnar check-ins must all have the same length")
+        cols = {
+            f: np.asarray(checkins[f], dtype=np.float64) if checkins.get(f) is not None else np.full(size, 3.0)
+            for f in _LIKERT_FIELDS
+        }
+    else:
+        rows = checkins if isinstance(checkins, list) else list(checkins)
+        cols = {
+            f: np.fromiter((r.get(f, 3) for r in rows), dtype=np.float64, count=len(rows))
+            for f in _LIKERT_FIELDS
+        }
+
+    # same weighting as score_checkin()
+    mood_index = 100 * (
+        0.30 * (cols["mood"] - 1) / 4 +
+        0.25 * (5 - cols["stress"]) / 4 +
+        0.15 * (cols["energy"] - 1) / 4 +
+        0.15 * (cols["connection"] - 1) / 4 +
+        0.15 * (cols["motivation"] - 1) / 4
+    )
+    return np.round(np.clip(mood_index, 0, 100), 2)
+
+
 def ema(series: List[float], k: int) -> float:
     """
     Calculate Exponential Moving Average over k periods.
@@ -122,9 +162,183 @@ def compute_series_stats(mood_indices: List[float]) -> Dict[str, Any]:
     if not mood_indices:
         return {"ema7": 0.0, "ema14": 0.0, "zscore": 0.0, "flag": "SAFE"}
     
+    # compute the z-score once and derive the flag from it (same rule as flag_from_trend)
+    z = zscore(mood_indices)
     return {
         "ema7": ema(mood_indices, 7),
         "ema14": ema(mood_indices, 14),
-        "zscore": zscore(mood_indices),
-        "flag": flag_from_trend(mood_indices)
-    }
\ No newline at end of file
+        "zscore": z,
+        "flag": "WATCH" if len(mood_indices) >= 3 and z <= -1.5 else "SAFE"
+    }
+
+
+class StreamingStats:
+    """
+    Constant-time streaming analytics for one mood index series.
+    Each update() is O(1) regardless of history length:
+      - EMA-k for any set of periods (seeded with the first value, like ema())
+      - Welford running mean / variance over the whole history
+      - z-score of the latest point over a rolling window (running sum / sum of squares)
+    Serialises to a compact dict via to_dict() / from_dict() for storage.
+    """
+
+    __slots__ = ("periods", "emas", "n", "mean", "m2", "window", "wsum", "wsumsq")
+
+    def __init__(self, periods: Iterable[int] = (7, 14), window: int = 30):
+        self.periods = tuple(periods)
+        self.emas = [0.0] * len(self.periods)
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.window = deque(maxlen=window)
+        self.wsum = 0.0
+        self.wsumsq = 0.0
+
+    def update(self, value: float) -> "StreamingStats":
+        """Fold one new point into every accumulator."""
+        x = float(value)
+        self.n += 1
+
+        if self.n == 1:
+            self.emas = [x] * len(self.periods)
+        else:
+            for i, k in enumerate(self.periods):
+                alpha = 2.0 / (k + 1)
+                self.emas[i] = alpha * x + (1 - alpha) * self.emas[i]
+
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+        if len(self.window) == self.window.maxlen:
+            old = self.window[0]
+            self.wsum -= old
+            self.wsumsq -= old * old
+        self.window.append(x)
+        self.wsum += x
+        self.wsumsq += x * x
+        return self
+
+    def ema(self, k: int) -> float:
+        return round(self.emas[self.periods.index(k)], 2) if self.n else 0.0
+
+    @property
+    def variance(self) -> float:
+        """Population variance over the whole history (Welford)."""
+        return self.m2 / self.n if self.n else 0.0
+
+    def zscore(self) -> float:
+        """z-score of the latest point against the rolling window, as zscore() on that window."""
+        m = len(self.window)
+        if m < 2:
+            return 0.0
+        mean_val = self.wsum / m
+        variance = max(0.0, self.wsumsq / m - mean_val * mean_val)
+        std_val = math.sqrt(variance)
+        # guard against round-off leaving a tiny variance on a constant window
+        if std_val <= 1e-9 * max(1.0, abs(mean_val)):
+            return 0.0
+        return round((self.window[-1] - mean_val) / std_val, 3)
+
+    def stats(self) -> Dict[str, Any]:
+        """Same shape as compute_series_stats() for the current window."""
+        if not self.n:
+            return {"ema7": 0.0, "ema14": 0.0, "zscore": 0.0, "flag": "SAFE"}
+        z = self.zscore()
+        return {
+            "ema7": self.ema(7),
+            "ema14": self.ema(14),
+            "zscore": z,
+            "flag": "WATCH" if len(self.window) >= 3 and z <= -1.5 else "SAFE"
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "p": list(self.periods),
+            "e": list(self.emas),
+            "n": self.n,
+            "mu": self.mean,
+            "m2": self.m2,
+            "wn": self.window.maxlen,
+            "w": list(self.window),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]], periods: Iterable[int] = (7, 14), window: int = 30) -> "StreamingStats":
+        """Restore from to_dict() output; None/empty returns a fresh instance."""
+        if not data:
+            return cls(periods, window)
+        obj = cls(data["p"], data["wn"])
+        obj.emas = list(data["e"])
+        obj.n = data["n"]
+        obj.mean = data["mu"]
+        obj.m2 = data["m2"]
+        obj.window.extend(data["w"])
+        obj.wsum = sum(obj.window)
+        obj.wsumsq = sum(x * x for x in obj.window)
+        return obj
+
+
+def _masked_ema(values: np.ndarray, mask: np.ndarray, rank: np.ndarray, n: np.ndarray, k: int) -> np.ndarray:
+    """
+    Closed-form EMA over each row's observed values (missing days are skipped).
+    Seeded with the first observation like ema():
+        ema = (1-a)^(n-1) * x_1 + sum_{i>=2} a * (1-a)^(n-i) * x_i
+    """
+    alpha = 2.0 / (k + 1)
+    decay = np.power(1 - alpha, np.maximum(n[:, None] - rank, 0))
+    weights = np.where(rank == 1, decay, alpha * decay)
+    weights = np.where(mask, weights, 0.0)
+    return (weights * values).sum(axis=1)
+
+
+def cohort_series_stats(
+    mood_matrix: Any,
+    mask: Optional[Any] = None,
+    window: int = 30,
+) -> Dict[str, np.ndarray]:
+    """
+    Vectorised compute_series_stats() for many users at once.
+    mood_matrix: users x days array of mood indices, oldest day first.
+    mask: optional boolean array of the same shape, True where a day was observed
+          (NaN entries are always treated as missing).
+    The z-score uses each user's last `window` observed days, like StreamingStats.
+    Returns arrays of length n_users: ema7, ema14, zscore, flag ("SAFE"/"WATCH") and count.
+    """
+    values = np.asarray(mood_matrix, dtype=np.float64)
+    if values.ndim != 2:
+        raise ValueError("mood_matrix must be a 2-D users x days array")
+    observed = ~np.isnan(values)
+    if mask is not None:
+        observed &= np.asarray(mask, dtype=bool)
+    values = np.where(observed, values, 0.0)
+
+    rank = np.cumsum(observed, axis=1)       # 1-based index of each observation per user
+    n = rank[:, -1] if values.shape[1] else np.zeros(values.shape[0], dtype=np.int64)
+
+    ema7 = _masked_ema(values, observed, rank, n, 7)
+    ema14 = _masked_ema(values, observed, rank, n, 14)
+
+    # z-score of the latest observation against the user's rolling window
+    in_window = observed & (rank > (n - window)[:, None])
+    count = in_window.sum(axis=1)
+    safe_count = np.maximum(count, 1)
+    mean = np.where(in_window, values, 0.0).sum(axis=1) / safe_count
+    variance = np.where(in_window, (values - mean[:, None]) ** 2, 0.0).sum(axis=1) / safe_count
+    std = np.sqrt(variance)
+
+    last_idx = values.shape[1] - 1 - np.argmax(observed[:, ::-1], axis=1) if values.shape[1] else n
+    last = values[np.arange(values.shape[0]), last_idx] if values.shape[1] else np.zeros(values.shape[0])
+    valid = (count >= 2) & (std > 0)
+    z = np.zeros(values.shape[0])
+    np.divide(last - mean, std, out=z, where=valid)
+
+    zscores = np.round(z, 3)
+    flags = np.where((count >= 3) & (zscores <= -1.5), "WATCH", "SAFE")
+    return {
+        "ema7": np.round(ema7, 2),
+        "ema14": np.round(ema14, 2),
+        "zscore": zscores,
+        "flag": flags,
+        "count": n,
+    }
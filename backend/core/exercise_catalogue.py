@@ -0,0 +1,166 @@
+import json
+import os
+import random
+import re
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from core.recommender import _fallback_exercise, prepare_recommendation
+from logger.custom_logger import CustomLogger
+
+_LOG = CustomLogger().get_logger(__name__)
+
+# The precomputed grid: facet x emotion x duration
+CATALOGUE_FACETS = ("self_awareness", "self_regulation", "motivation", "empathy", "social_skills")
+CATALOGUE_EMOTIONS = ("neutral", "anxiety", "stress", "anger", "frustration", "sadness", "overwhelm", "joy")
+CATALOGUE_DURATIONS = ("2min", "5min", "10min")
+
+DEFAULT_CATALOGUE_PATH = os.getenv("EXERCISE_CATALOGUE_PATH", os.path.join("data", "exercise_catalogue.json"))
+
+
+def catalogue_key(facet: str, emotion: str, duration: str) -> str:
+    return f"{facet}|{emotion}|{duration}"
+
+
+def _norm(s: Any) -> str:
+    return re.sub(r"[\s\-]+", "_", str(s or "").strip().lower())
+
+
+def normalize_duration(duration_hint: str) -> str:
+    """Snap a free-form hint ("2 min", "3-minute", "10min") to the nearest catalogue duration."""
+    m = re.search(r"\d+", str(duration_hint or ""))
+    if not m:
+        return CATALOGUE_DURATIONS[0]
+    minutes = int(m.group())
+    return min(CATALOGUE_DURATIONS, key=lambda d: abs(int(d[:-3]) - minutes))
+
+
+class ExerciseCatalogue:
+    """
+    Precomputed, validated exercises for every (facet, emotion, duration) cell.
+
+    File layout (compact JSON):
+        {"version": 1, "built_at": iso,
+         "grid": {"facets": [...], "emotions": [...], "durations": [...]},
+         "exercises": {"<facet>|<emotion>|<duration>": [<prepared exercise>, ...]}}
+    `lookup` is a dict hit plus random.choice over the cell's variants; it returns
+    None when the request carries context the grid does not cover, so the caller
+    can fall back to RAG + LLM.
+    """
+
+    def __init__(self, exercises: Optional[Dict[str, List[Dict[str, Any]]]] = None):
+        self.exercises = exercises or {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_CATALOGUE_PATH) -> "ExerciseCatalogue":
+        if not os.path.exists(path):
+            _LOG.info("Exercise catalogue not found; exercises will be generated online", path=path)
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        _LOG.info("Exercise catalogue loaded", path=path, cells=len(data.get("exercises", {})))
+        return cls(data.get("exercises", {}))
+
+    def save(self, path: str = DEFAULT_CATALOGUE_PATH):
+        data = {
+            "version": 1,
+            "built_at": datetime.now(timezone.utc).isoformat(),
+            "grid": {
+                "facets": list(CATALOGUE_FACETS),
+                "emotions": list(CATALOGUE_EMOTIONS),
+                "durations": list(CATALOGUE_DURATIONS),
+            },
+            "exercises": self.exercises,
+        }
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def __len__(self) -> int:
+        return len(self.exercises)
+
+    def lookup(self, target_facets: List[str], context_tags: List[str], duration_hint: str = "2min") -> Optional[Dict[str, Any]]:
+        """Random precomputed exercise for this request, or None when it needs the LLM."""
+        facets = {_norm(f) for f in (target_facets or []) if _norm(f)}
+        tags = {_norm(t) for t in (context_tags or []) if _norm(t)}
+        # cells hold one facet and one emotion; anything more needs personalising by the LLM
+        facet = next(iter(facets)) if len(facets) == 1 else None
+        if facet not in CATALOGUE_FACETS or len(tags) > 1 or not tags <= set(CATALOGUE_EMOTIONS):
+            self.misses += 1
+            return None
+
+        emotion = next(iter(tags), "neutral")
+        variants = self.exercises.get(catalogue_key(facet, emotion, normalize_duration(duration_hint)))
+        if not variants:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(random.choice(variants))
+
+    def stats(self) -> Dict[str, int]:
+        return {"cells": len(self.exercises), "hits": self.hits, "misses": self.misses}
+
+
+_catalogue: Optional[ExerciseCatalogue] = None
+_catalogue_lock = threading.Lock()
+
+
+def get_catalogue() -> ExerciseCatalogue:
+    """Process-wide catalogue, loaded on first use."""
+    global _catalogue
+    if _catalogue is None:
+        with _catalogue_lock:
+            if _catalogue is None:
+                _catalogue = ExerciseCatalogue.load()
+    return _catalogue
+
+
+def build_catalogue(rag: Any, retriever: Any, variants: int = 3, max_attempts: int = 6) -> ExerciseCatalogue:
+    """
+    Offline batch job: for every grid cell retrieve chunks, synthesise exercises with
+    the LLM, validate them with `prepare_recommendation` and keep up to `variants`
+    distinct ones. Fallback exercises (invalid LLM output) are never stored.
+    """
+    fallback_id = _fallback_exercise()["exercise_id"]
+    exercises: Dict[str, List[Dict[str, Any]]] = {}
+    for facet in CATALOGUE_FACETS:
+        for emotion in CATALOGUE_EMOTIONS:
+            tags = [] if emotion == "neutral" else [emotion]
+            for duration in CATALOGUE_DURATIONS:
+                query = " ".join([facet] + tags + [duration, "exercise"])
+                chunks = rag.search(retriever, query, k=5, keyword_only=True)
+                cell: List[Dict[str, Any]] = []
+                titles = set()
+                for _ in range(max_attempts):
+                    if len(cell) >= variants:
+                        break
+                    rec = prepare_recommendation(rag.synthesize_exercise(chunks, [facet], tags, duration))
+                    if rec["exercise_id"] in (fallback_id, "fallback_exercise") or rec["title"].lower() in titles:
+                        continue
+                    titles.add(rec["title"].lower())
+                    cell.append(rec)
+                if cell:
+                    exercises[catalogue_key(facet, emotion, duration)] = cell
+                _LOG.info("Catalogue cell built", facet=facet, emotion=emotion, duration=duration, variants=len(cell))
+    return ExerciseCatalogue(exercises)
+
+
+if __name__ == "__main__":
+    # python -m core.exercise_catalogue [faiss_dir] [output_path]
+    import sys
+
+    from rag.rag_pipeline import ConversationalRAG
+
+    faiss_dir = sys.argv[1] if len(sys.argv) > 1 else "rag/vectorstore"
+    out_path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_CATALOGUE_PATH
+    rag = ConversationalRAG(faiss_dir=faiss_dir)
+    catalogue = build_catalogue(rag, rag.load_retriever_from_faiss())
+    catalogue.save(out_path)
+    total = sum(len(v) for v in catalogue.exercises.values())
+    print(f"Wrote {total} exercises in {len(catalogue)} cells to {out_path}")
@@ -1,63 +1,97 @@
 import os
-from typing import Optional
+import asyncio
+from datetime import date, timedelta
+from typing import Optional, Iterable
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase, AsyncIOMotorCollection
-from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo import IndexModel, ASCENDING, DESCENDING, DeleteOne, ReplaceOne, ReturnDocument
+from pymongo.errors import AutoReconnect, BulkWriteError, DuplicateKeyError, PyMongoError, ServerSelectionTimeoutError
 from logger.custom_logger import CustomLogger
 from dotenv import load_dotenv
-from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
 import time
 load_dotenv()
 
 _LOG = CustomLogger().get_logger(__name__)
 
-# Global client instance
+# per-operation write error codes worth retrying: duplicate key (concurrent upserts of
+# the same key), write conflicts, and primary/network churn; anything else fails the same way again
+RETRYABLE_WRITE_CODES = {11000, 112, 6, 7, 89, 91, 189, 262, 9001, 10107, 11600, 11602, 13435, 13436}
+
+# Projections for hot read paths
+MOOD_SERIES_PROJECTION = {"_id": 0, "date": 1, "mood_index": 1}
+MOOD_SERIES_INDEX = "user_date_mood_covering"
+# fields an authenticated request never needs
+AUTH_USER_PROJECTION = {"created_at": 0, "last_login": 0, "updated_at": 0}
+
+# Global client instance (one pooled async client per process, created lazily)
 _client: Optional[AsyncIOMotorClient] = None
 _database: Optional[AsyncIOMotorDatabase] = None
+_ready = False
 
-#1234
-async def init_db() -> AsyncIOMotorDatabase:
-    """Initialize MongoDB connection and return database instance."""
+
+def _create_client() -> AsyncIOMotorClient:
+    """Build the Motor client; no I/O happens until the first operation."""
+    mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+    return AsyncIOMotorClient(
+        mongo_uri,
+        server_api=ServerApi(os.getenv("MONGO_SERVER_API", "1")),
+        maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+        minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+        maxIdleTimeMS=int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000")),
+        serverSelectionTimeoutMS=int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+    )
+
+
+def _get_database_lazy() -> AsyncIOMotorDatabase:
     global _client, _database
+    if _database is None:
+        _client = _create_client()
+        _database = _client[os.getenv("DB_NAME", "raai_db")]
+    return _database
+
+
+async def init_db() -> AsyncIOMotorDatabase:
+    """Connect (ping) and create indexes; marks the database ready. Meant for app startup."""
+    global _ready
     
-    if _database is not None:
-        return _database
-    
-    mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-    db_name = os.getenv("DB_NAME", "raai_db")
+    database = _get_database_lazy()
+    if _ready:
+        return database
     
     try:
-        _client = AsyncIOMotorClient(mongo_uri)
-        _database = _client[db_name]
-        
         # Test connection
         await _client.admin.command('ping')
-        _LOG.info("MongoDB connection established", db_name=db_name)
+        _LOG.info("MongoDB connection established", db_name=database.name)
         
         # Create indexes
         await create_indexes()
         
-        return _database
+        _ready = True
+        return database
     except Exception as e:
         _LOG.error("Failed to connect to MongoDB", error=str(e))
         raise
 
 
+def is_db_ready() -> bool:
+    """True once init_db() has pinged the server and created indexes."""
+    return _ready
+
+
 async def close_db():
     """Close MongoDB connection."""
-    global _client, _database
+    global _client, _database, _ready
     if _client:
         _client.close()
         _client = None
         _database = None
+        _ready = False
         _LOG.info("MongoDB connection closed")
 
 
 async def get_database() -> AsyncIOMotorDatabase:
-    """Get database instance, initializing if needed."""
-    if _database is None:
-        return await init_db()
-    return _database
+    """Get database instance; the client is created on first use without blocking on a ping."""
+    return _get_database_lazy()
 
 
 async def get_collection(name: str) -> AsyncIOMotorCollection:
@@ -84,7 +118,17 @@ async def create_indexes():
         await checkins.create_indexes([
             IndexModel([("user_id", ASCENDING), ("date", ASCENDING)], unique=True),
             IndexModel([("user_id", ASCENDING)]),
-            IndexModel([("date", ASCENDING)])
+            IndexModel([("date", ASCENDING)]),
+            IndexModel([("team_id", ASCENDING), ("date", ASCENDING)]),
+            # covers get_user_mood_series (no document fetch)
+            IndexModel([("user_id", ASCENDING), ("date", DESCENDING), ("mood_index", ASCENDING)],
+                       name=MOOD_SERIES_INDEX)
+        ])
+        
+        # Team daily rollups (one small document per team per day)
+        team_daily_rollups = db.team_daily_rollups
+        await team_daily_rollups.create_indexes([
+            IndexModel([("team_id", ASCENDING), ("date", DESCENDING)], unique=True)
         ])
         
         # Challenges collection indexes
@@ -146,85 +190,327 @@ class Collections:
     @staticmethod
     async def resources() -> AsyncIOMotorCollection:
         return await get_collection("resources")
+    
+    @staticmethod
+    async def analytics_state() -> AsyncIOMotorCollection:
+        return await get_collection("analytics_state")
+    
+    @staticmethod
+    async def team_daily_rollups() -> AsyncIOMotorCollection:
+        return await get_collection("team_daily_rollups")
 
 
 # Utility functions for common operations
-async def find_user_by_email(email: str) -> Optional[dict]:
-    """Find user by email address."""
+async def find_user_by_email(email: str, projection: Optional[dict] = None) -> Optional[dict]:
+    """Find user by email address, optionally returning only the projected fields."""
     users = await Collections.users()
-    return await users.find_one({"email": email})
+    return await users.find_one({"email": email}, projection)
 
 
-async def find_user_by_id(user_id: str) -> Optional[dict]:
-    """Find user by ID."""
+async def find_user_by_id(user_id: str, projection: Optional[dict] = None) -> Optional[dict]:
+    """Find user by ID, optionally returning only the projected fields."""
     users = await Collections.users()
-    return await users.find_one({"_id": user_id})
+    return await users.find_one({"_id": user_id}, projection)
+
+
+async def _team_ids_for_users(user_ids: Iterable[str]) -> dict:
+    """Map user_id -> team_id for the given users (users without a team are omitted)."""
+    users = await Collections.users()
+    cursor = users.find({"_id": {"$in": list(user_ids)}, "team_id": {"$ne": None}}, {"team_id": 1})
+    return {u["_id"]: u["team_id"] async for u in cursor}
+
+
+async def _inc_team_rollup(team_id: str, day: str, mood_delta: float, count_delta: int):
+    rollups = await Collections.team_daily_rollups()
+    await rollups.update_one(
+        {"team_id": team_id, "date": day},
+        {"$inc": {"mood_sum": mood_delta, "count": count_delta, "participant_count": count_delta}},
+        upsert=True
+    )
 
 
 async def upsert_checkin(checkin_data: dict) -> dict:
-    """Upsert checkin data (update if exists, insert if not)."""
+    """
+    Upsert checkin data (update if exists, insert if not).
+    The user's team_id is looked up server-side and stamped on the checkin
+    (any client-supplied value is overwritten), and the team's daily rollup
+    is adjusted incrementally (replacing a day's checkin only shifts the sum).
+    """
     checkins = await Collections.checkins()
     filter_query = {"user_id": checkin_data["user_id"], "date": checkin_data["date"]}
     
-    result = await checkins.replace_one(
+    team_ids = await _team_ids_for_users([checkin_data["user_id"]])
+    checkin_data["team_id"] = team_ids.get(checkin_data["user_id"])
+    
+    # one atomic round trip that also hands back what it replaced (None on insert)
+    previous = await checkins.find_one_and_replace(
         filter_query,
         checkin_data,
-        upsert=True
+        projection={"mood_index": 1, "team_id": 1},
+        upsert=True,
+        return_document=ReturnDocument.BEFORE
     )
     
-    if result.upserted_id:
-        checkin_data["_id"] = result.upserted_id
+    if previous:
+        checkin_data["_id"] = previous["_id"]
+    
+    # Keep team_daily_rollups in step with the checkin
+    day = checkin_data["date"]
+    team_id = checkin_data.get("team_id")
+    new_mood = checkin_data.get("mood_index", 0.0)
+    old_team = previous.get("team_id") if previous else None
+    old_mood = previous.get("mood_index", 0.0) if previous else 0.0
+    if previous and old_team and old_team != team_id:
+        await _inc_team_rollup(old_team, day, -old_mood, -1)
+        previous = None
+    if team_id:
+        if previous:
+            await _inc_team_rollup(team_id, day, new_mood - old_mood, 0)
+        else:
+            await _inc_team_rollup(team_id, day, new_mood, 1)
     
     return checkin_data
 
 
-async def get_user_checkins(user_id: str, days: int = 30) -> list:
-    """Get recent checkins for a user."""
+async def refresh_team_rollups(keys: Iterable[tuple]):
+    """
+    Recompute the rollup documents for the given (team_id, date) pairs from the checkins:
+    one aggregate over all pairs, then one unordered bulk_write (replace, or delete
+    when a pair no longer has checkins).
+    """
+    keys = set(keys)
+    if not keys:
+        return
+    checkins = await Collections.checkins()
+    rollups = await Collections.team_daily_rollups()
+    # $in on both fields can over-select (t1, d2) when only (t1, d1) and (t2, d2) were asked for
+    agg = await checkins.aggregate([
+        {"$match": {"team_id": {"$in": list({t for t, _ in keys})}, "date": {"$in": list({d for _, d in keys})}}},
+        {"$group": {"_id": {"team_id": "$team_id", "date": "$date"},
+                    "mood_sum": {"$sum": "$mood_index"}, "count": {"$sum": 1},
+                    "participants": {"$addToSet": "$user_id"}}}
+    ]).to_list(length=None)
+    found = {(g["_id"]["team_id"], g["_id"]["date"]): g for g in agg}
+    
+    ops = []
+    for team_id, day in keys:
+        g = found.get((team_id, day))
+        if g is None:
+            ops.append(DeleteOne({"team_id": team_id, "date": day}))
+            continue
+        ops.append(ReplaceOne(
+            {"team_id": team_id, "date": day},
+            {"team_id": team_id, "date": day, "mood_sum": g["mood_sum"],
+             "count": g["count"], "participant_count": len(g["participants"])},
+            upsert=True
+        ))
+    await rollups.bulk_write(ops, ordered=False)
+
+
+# teams whose rollups are known to exist (or were rebuilt) in this process
+_backfilled_teams: set = set()
+
+
+async def rebuild_team_rollups(team_id: str):
+    """
+    Backfill/repair every rollup of one team from its members' checkins.
+    Checkins written before rollups existed carry no team_id; they are stamped
+    with the member's current team first.
+    """
+    users = await Collections.users()
+    member_ids = await users.distinct("_id", {"team_id": team_id})
+    checkins = await Collections.checkins()
+    await checkins.update_many({"user_id": {"$in": member_ids}, "team_id": None}, {"$set": {"team_id": team_id}})
+    days = await checkins.distinct("date", {"team_id": team_id})
+    await refresh_team_rollups((team_id, d) for d in days)
+    _backfilled_teams.add(team_id)
+
+
+async def backfill_team_rollups() -> int:
+    """One-off migration: stamp team_id on old checkins and build the rollups of every team."""
+    users = await Collections.users()
+    team_ids = [t for t in await users.distinct("team_id") if t]
+    for team_id in team_ids:
+        await rebuild_team_rollups(team_id)
+    _LOG.info("Team rollups backfilled", teams=len(team_ids))
+    return len(team_ids)
+
+
+async def _ensure_team_rollups(team_id: str):
+    """Lazily backfill a team that has checkins from before rollups existed."""
+    if team_id in _backfilled_teams:
+        return
+    rollups = await Collections.team_daily_rollups()
+    if await rollups.find_one({"team_id": team_id}, {"_id": 1}) is None:
+        await rebuild_team_rollups(team_id)
+    _backfilled_teams.add(team_id)
+
+
+async def bulk_upsert_checkins(
+    checkins_data: list,
+    batch_size: int = 1000,
+    max_in_flight: int = 4,
+    max_retries: int = 2
+) -> dict:
+    """
+    Upsert many checkins as unordered bulk_write batches of `batch_size` ReplaceOne ops,
+    with at most `max_in_flight` batches outstanding. Only the operations that failed
+    transiently (RETRYABLE_WRITE_CODES, network errors) are retried, up to `max_retries`
+    times with backoff; any other failure is reported right away.
+    Returns totals plus a per-batch report.
+    """
+    totals = {"upserted": 0, "modified": 0, "matched": 0, "failed": 0, "batches": []}
+    if not checkins_data:
+        return totals
+    
+    # team membership always comes from users, never from the request
+    team_ids = await _team_ids_for_users({c["user_id"] for c in checkins_data})
+    for c in checkins_data:
+        c["team_id"] = team_ids.get(c["user_id"])
+    
+    checkins = await Collections.checkins()
+    slots = asyncio.Semaphore(max_in_flight)
+    
+    async def run_batch(batch_no: int, docs: list) -> dict:
+        report = {"batch": batch_no, "size": len(docs), "upserted": 0, "modified": 0, "matched": 0, "retries": 0}
+        pending = docs
+        permanent = 0
+        async with slots:
+            for attempt in range(max_retries + 1):
+                if attempt:
+                    report["retries"] += 1
+                    await asyncio.sleep(0.1 * 2 ** (attempt - 1))
+                ops = [ReplaceOne({"user_id": c["user_id"], "date": c["date"]}, c, upsert=True) for c in pending]
+                try:
+                    result = await checkins.bulk_write(ops, ordered=False)
+                    report["upserted"] += result.upserted_count
+                    report["modified"] += result.modified_count
+                    report["matched"] += result.matched_count
+                    pending = []
+                    break
+                except BulkWriteError as e:
+                    details = e.details
+                    report["upserted"] += details.get("nUpserted", 0)
+                    report["modified"] += details.get("nModified", 0)
+                    report["matched"] += details.get("nMatched", 0)
+                    errors = {err["index"]: err for err in details.get("writeErrors", [])}
+                    retryable = sorted(i for i, err in errors.items() if err.get("code") in RETRYABLE_WRITE_CODES)
+                    permanent += len(errors) - len(retryable)
+                    pending = [pending[i] for i in retryable]
+                    _LOG.warning("Bulk checkin batch partially failed", batch=batch_no, retryable=len(pending),
+                                 permanent=len(errors) - len(retryable), attempt=attempt)
+                    if not pending:
+                        break
+                except PyMongoError as e:
+                    # whole batch failed: retry network / server selection trouble, give up on the rest
+                    transient = isinstance(e, (AutoReconnect, ServerSelectionTimeoutError)) \
+                        or e.has_error_label("RetryableWriteError")
+                    _LOG.warning("Bulk checkin batch failed", batch=batch_no, error=str(e), attempt=attempt,
+                                 retrying=transient)
+                    if not transient:
+                        break
+        report["failed"] = permanent + len(pending)
+        return report
+    
+    batches = [checkins_data[i:i + batch_size] for i in range(0, len(checkins_data), batch_size)]
+    reports = await asyncio.gather(*(run_batch(n, docs) for n, docs in enumerate(batches)))
+    
+    for report in reports:
+        for key in ("upserted", "modified", "matched", "failed"):
+            totals[key] += report[key]
+    totals["batches"] = list(reports)
+    await refresh_team_rollups((c["team_id"], c["date"]) for c in checkins_data if c.get("team_id"))
+    _LOG.info("Bulk checkin upsert finished", count=len(checkins_data), batches=len(batches),
+              upserted=totals["upserted"], modified=totals["modified"], failed=totals["failed"])
+    return totals
+
+
+async def get_user_checkins(user_id: str, days: int = 30, projection: Optional[dict] = None) -> list:
+    """Get recent checkins for a user (full documents unless a projection is given)."""
     checkins = await Collections.checkins()
     cursor = checkins.find(
-        {"user_id": user_id}
+        {"user_id": user_id},
+        projection
     ).sort("date", DESCENDING).limit(days)
     
     return await cursor.to_list(length=days)
 
 
-async def get_team_participation_stats(team_id: str, min_users: int = 5) -> Optional[dict]:
-    """Get team participation statistics, respecting k-anonymity."""
+async def get_user_mood_series(user_id: str, days: Optional[int] = 30) -> list:
+    """
+    Get recent {date, mood_index} pairs, newest first (days=None: the full history).
+    The projection and sort match MOOD_SERIES_INDEX, so the query is answered from the index alone.
+    """
+    checkins = await Collections.checkins()
+    cursor = checkins.find(
+        {"user_id": user_id},
+        MOOD_SERIES_PROJECTION
+    ).sort("date", DESCENDING)
+    if days:
+        cursor = cursor.limit(days)
+    
+    return await cursor.to_list(length=days)
+
+
+async def get_trend_state(user_id: str) -> Optional[dict]:
+    """Get the per-user running analytics state (EMA / Welford accumulators)."""
+    analytics_state = await Collections.analytics_state()
+    return await analytics_state.find_one({"_id": user_id})
+
+
+async def save_trend_state(user_id: str, state_doc: dict, version: int = 0) -> Optional[dict]:
+    """
+    Persist the per-user running analytics state if it is still at `version`
+    (the `v` read with get_trend_state; 0 for a new or pre-versioning document).
+    Returns the stored document, or None when another writer got there first.
+    """
+    analytics_state = await Collections.analytics_state()
+    state_doc = {**state_doc, "_id": user_id, "v": version + 1}
+    # v: None also matches documents written before the counter existed
+    try:
+        await analytics_state.replace_one({"_id": user_id, "v": version or None}, state_doc, upsert=True)
+    except DuplicateKeyError:
+        # no match, so the upsert tried to insert a second document with this _id
+        return None
+    return state_doc
+
+
+async def get_team_participation_stats(team_id: str, min_users: int = 5, days: int = 30) -> Optional[dict]:
+    """
+    Get team participation statistics, respecting k-anonymity.
+    Mood trends come from the materialised team_daily_rollups (one indexed range read);
+    days with fewer than `min_users` participants are suppressed.
+    """
     users = await Collections.users()
-    team_size = await users.count_documents({"team_id": team_id})
+    member_ids = await users.distinct("_id", {"team_id": team_id})
+    team_size = len(member_ids)
     
     if team_size < min_users:
         return None  # Respect k-anonymity
     
-    # Aggregate recent checkins and participation
-    checkins = await Collections.checkins()
-    participation = await Collections.participation()
-    
     # Get average mood trends (no individual data)
-    pipeline = [
-        {"$match": {"team_id": team_id}},
-        {"$lookup": {
-            "from": "checkins",
-            "localField": "_id",
-            "foreignField": "user_id", 
-            "as": "checkins"
-        }},
-        {"$unwind": "$checkins"},
-        {"$group": {
-            "_id": "$checkins.date",
-            "avg_mood_index": {"$avg": "$checkins.mood_index"},
-            "participant_count": {"$sum": 1}
-        }},
-        {"$sort": {"_id": -1}},
-        {"$limit": 30}
+    await _ensure_team_rollups(team_id)
+    rollups = await Collections.team_daily_rollups()
+    cursor = rollups.find(
+        {"team_id": team_id},
+        {"_id": 0, "date": 1, "mood_sum": 1, "participant_count": 1}
+    ).sort("date", DESCENDING).limit(days)
+    mood_trends = [
+        {
+            "_id": r["date"],
+            "avg_mood_index": r["mood_sum"] / r["participant_count"],
+            "participant_count": r["participant_count"]
+        }
+        async for r in cursor
+        if r.get("participant_count", 0) >= min_users
     ]
     
-    users_coll = await Collections.users()
-    mood_trends = await users_coll.aggregate(pipeline).to_list(length=30)
-    
-    # Get participation rate
+    # Get participation rate: team members active in any challenge (team or org-wide)
+    participation = await Collections.participation()
+    since = (date.today() - timedelta(days=days)).isoformat()
     active_participants = await participation.distinct("user_id", {
-        "last_completed": {"$gte": "2024-01-01"}  # Adjust date as needed
+        "user_id": {"$in": member_ids},
+        "last_completed": {"$gte": since}
     })
     
     participation_rate = len(active_participants) / team_size if team_size > 0 else 0
@@ -255,14 +541,11 @@ async def upsert_checkin_safe(checkin_data: dict) -> dict:
         return checkin_data
 
 
-uri = os.getenv("MONGO_URI")  
-
-
-client = MongoClient(uri, server_api=ServerApi('1'))
 
-
-try:
-    client.admin.command('ping')
-    print("Pinged your deployment. You successfully connected to MongoDB!")
-except Exception as e:
-    print(e)
\ No newline at end of file
+if __name__ == "__main__":
+    import sys
+    
+    if sys.argv[1:] != ["backfill-rollups"]:
+        sys.exit("usage: python db.py backfill-rollups")
+    # One-off migration for checkins written before team rollups
+    asyncio.run(backfill_team_rollups())
@@ -0,0 +1,66 @@
+"""
+Covered-query benchmark for the mood series read path.
+
+Creates indexes, inserts and deletes a synthetic user's checkins, so it only runs
+against an explicitly named scratch database:
+
+    BENCH_DB_NAME=raai_bench python db_benchmark.py
+"""
+import asyncio
+import os
+import sys
+from datetime import date, timedelta
+
+from dotenv import load_dotenv
+
+PROTECTED_DB_NAMES = {"raai_db"}
+
+
+def _scratch_db_name() -> str:
+    load_dotenv()  # so the application's DB_NAME from .env is known (and refused)
+    name = os.getenv("BENCH_DB_NAME", "").strip()
+    if not name:
+        sys.exit("Refusing to run: set BENCH_DB_NAME to a scratch database (it will be written to)")
+    if name in PROTECTED_DB_NAMES or name == os.getenv("DB_NAME"):
+        sys.exit(f"Refusing to run: BENCH_DB_NAME={name!r} is the application database")
+    return name
+
+
+async def benchmark_mood_series(n_days: int = 365):
+    """Compare documents examined vs returned for the trend query before/after the covering index."""
+    from db import MOOD_SERIES_INDEX, MOOD_SERIES_PROJECTION, Collections, create_indexes, get_database
+    from pymongo import ASCENDING, DESCENDING
+
+    db = await get_database()
+    if db.name != os.environ["DB_NAME"]:
+        sys.exit(f"Refusing to run: connected to {db.name!r}, not the scratch database")
+
+    user_id = "bench_user"
+    checkins = await Collections.checkins()
+    await create_indexes()
+    await checkins.delete_many({"user_id": user_id})
+    journal = "Today I wrote a fairly long journal entry about my day. " * 40
+    await checkins.insert_many([
+        {"user_id": user_id, "date": (date(2024, 1, 1) + timedelta(days=i)).isoformat(),
+         "mood_index": float(i % 100), "mood": 3, "stress": 3, "journal": journal}
+        for i in range(n_days)
+    ])
+
+    def summary(plan: dict) -> dict:
+        stats = plan["executionStats"]
+        return {"returned": stats["nReturned"], "docs_examined": stats["totalDocsExamined"],
+                "keys_examined": stats["totalKeysExamined"], "ms": stats["executionTimeMillis"]}
+
+    before = await checkins.find({"user_id": user_id}).sort("date", DESCENDING).limit(30) \
+        .hint([("user_id", ASCENDING), ("date", ASCENDING)]).explain()
+    after = await checkins.find({"user_id": user_id}, MOOD_SERIES_PROJECTION).sort("date", DESCENDING) \
+        .limit(30).hint(MOOD_SERIES_INDEX).explain()
+    print("before (full documents):", summary(before))
+    print("after  (covered query): ", summary(after))
+    await checkins.delete_many({"user_id": user_id})
+
+
+if __name__ == "__main__":
+    # must be set before db.py picks its database
+    os.environ["DB_NAME"] = _scratch_db_name()
+    asyncio.run(benchmark_mood_series())
@@ -0,0 +1,165 @@
+from typing import Any, Dict, Optional
+
+import faiss  # type: ignore
+import numpy as np
+
+from logger.custom_logger import CustomLogger
+
+log = CustomLogger().get_logger(__name__)
+
+INDEX_TYPES = ("flat", "ivfpq", "hnsw")
+
+DEFAULT_SETTINGS: Dict[str, Any] = {
+    "index_type": "flat",
+    # IVF-PQ
+    "nlist": 1024,          # coarse clusters
+    "m": 16,                # PQ sub-quantizers (must divide the dimension)
+    "nbits": 8,             # bits per sub-quantizer code
+    "nprobe": 16,           # clusters visited per query
+    "train_sample": 50000,  # vectors used to train the quantizers
+    "refine_k_factor": 0,   # >0: re-rank k * factor PQ candidates with exact distances
+    # HNSW
+    "hnsw_m": 32,
+    "ef_construction": 200,
+    "ef_search": 64,
+}
+
+
+def index_settings(config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Defaults overlaid with the `vector_store` block of config.yaml."""
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update({k: v for k, v in (config or {}).items() if v is not None})
+    if settings["index_type"] not in INDEX_TYPES:
+        raise ValueError(f"Unsupported vector_store.index_type: {settings['index_type']}")
+    return settings
+
+
+# k-means in FAISS wants at least this many training points per centroid
+POINTS_PER_CENTROID = 39
+
+
+def min_training_points(settings: Dict[str, Any]) -> int:
+    """
+    Fewest vectors an index type is trained on (0 when no training is needed).
+    For IVF-PQ both the coarse quantizer (nlist centroids) and each PQ codebook
+    (2**nbits centroids) need POINTS_PER_CENTROID points per centroid; below that
+    the index stays flat. Buffering, the flat -> IVF-PQ upgrade and build_index
+    all use this one threshold.
+    """
+    if settings["index_type"] == "ivfpq":
+        return POINTS_PER_CENTROID * max(int(settings["nlist"]), 2 ** int(settings["nbits"]))
+    return 0
+
+
+def _pq_subquantizers(dim: int, m: int) -> int:
+    """Largest divisor of dim that is <= m (PQ needs dim % m == 0)."""
+    m = max(1, min(m, dim))
+    while dim % m:
+        m -= 1
+    return m
+
+
+def build_index(dim: int, settings: Dict[str, Any], train_vectors: Optional[np.ndarray] = None) -> Any:
+    """
+    Create an empty (trained) FAISS index for `settings`, L2 metric as LangChain's FAISS uses.
+    IVF-PQ is trained on `train_sample` of `train_vectors` (never fewer than
+    `min_training_points`); with too few vectors to train it falls back to a flat index.
+    """
+    index_type = settings["index_type"]
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, int(settings["hnsw_m"]))
+        index.hnsw.efConstruction = int(settings["ef_construction"])
+        apply_search_params(index, settings)
+        return index
+
+    if index_type == "ivfpq":
+        n = 0 if train_vectors is None else len(train_vectors)
+        if n < min_training_points(settings):
+            log.warning("Too few vectors to train IVF-PQ; using a flat index",
+                        vectors=n, required=min_training_points(settings))
+            return faiss.IndexFlatL2(dim)
+        sample = np.ascontiguousarray(train_vectors, dtype=np.float32)
+        sample_size = max(int(settings["train_sample"]), min_training_points(settings))
+        if n > sample_size:
+            rows = np.random.default_rng(0).choice(n, sample_size, replace=False)
+            sample = sample[rows]
+        m = _pq_subquantizers(dim, int(settings["m"]))
+        quantizer = faiss.IndexFlatL2(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, int(settings["nlist"]), m, int(settings["nbits"]))
+        index.train(sample)
+        if int(settings["refine_k_factor"]) > 0:
+            # keeps full vectors next to the codes: more memory, near-exact recall
+            index = faiss.IndexRefineFlat(index)
+        apply_search_params(index, settings)
+        log.info("IVF-PQ index trained", nlist=int(settings["nlist"]), m=m, sample=len(sample))
+        return index
+
+    return faiss.IndexFlatL2(dim)
+
+
+def apply_search_params(index: Any, settings: Dict[str, Any]):
+    """Set query-time knobs (nprobe / efSearch); safe to call on a loaded index."""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = int(settings["ef_search"])
+        return
+    if isinstance(index, faiss.IndexRefine) and int(settings["refine_k_factor"]) > 0:
+        index.k_factor = float(settings["refine_k_factor"])
+    try:
+        faiss.extract_index_ivf(index).nprobe = int(settings["nprobe"])
+    except RuntimeError:
+        pass  # not an IVF index
+
+
+def _benchmark(n: int = 100_000, dim: int = 128, queries: int = 500, k: int = 10):
+    """Recall@k vs per-query latency over a synthetic clustered corpus."""
+    import time
+
+    rng = np.random.default_rng(42)
+    centers = rng.standard_normal((256, dim)).astype(np.float32) * 4
+    corpus = (centers[rng.integers(0, 256, n)] + rng.standard_normal((n, dim))).astype(np.float32)
+    qs = (centers[rng.integers(0, 256, queries)] + rng.standard_normal((queries, dim))).astype(np.float32)
+
+    exact = faiss.IndexFlatL2(dim)
+    exact.add(corpus)
+    _, truth = exact.search(qs, k)
+
+    def run(label: str, index: Any):
+        start = time.perf_counter()
+        for q in qs:  # one query at a time, like a request would
+            _, found = index.search(q[None, :], k)
+        per_query = (time.perf_counter() - start) / queries
+        _, found = index.search(qs, k)
+        recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+        print(f"{label:<28} recall@{k}={recall:.3f}  latency={per_query * 1e3:.3f} ms")
+
+    run("flat", exact)
+
+    settings = index_settings({"index_type": "ivfpq", "nlist": 1024, "m": 16, "train_sample": 50000})
+    start = time.perf_counter()
+    ivfpq = build_index(dim, settings, corpus)
+    ivfpq.add(corpus)
+    print(f"ivfpq build {time.perf_counter() - start:.1f}s")
+    for nprobe in (1, 4, 16, 64):
+        apply_search_params(ivfpq, {**settings, "nprobe": nprobe})
+        run(f"ivfpq nprobe={nprobe}", ivfpq)
+
+    settings = {**settings, "refine_k_factor": 4}
+    refined = build_index(dim, settings, corpus)
+    refined.add(corpus)
+    for nprobe in (4, 16, 64):
+        apply_search_params(refined, {**settings, "nprobe": nprobe})
+        run(f"ivfpq+refine nprobe={nprobe}", refined)
+
+    settings = index_settings({"index_type": "hnsw", "hnsw_m": 32, "ef_construction": 200})
+    start = time.perf_counter()
+    hnsw = build_index(dim, settings)
+    hnsw.add(corpus)
+    print(f"hnsw build {time.perf_counter() - start:.1f}s")
+    for ef in (16, 32, 64, 128):
+        apply_search_params(hnsw, {**settings, "ef_search": ef})
+        run(f"hnsw efSearch={ef}", hnsw)
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,106 @@
+import json
+import math
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it",
+    "of", "on", "or", "that", "the", "this", "to", "was", "with", "you", "your",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric terms; underscores split ("self_regulation" -> self, regulation)."""
+    return [t for t in _TOKEN.findall((text or "").lower()) if t not in _STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over an in-memory inverted index.
+
+    Persisted as compact JSON (bm25.json next to the FAISS index):
+        {"k1": float, "b": float, "ids": [doc_id, ...], "lengths": [int, ...],
+         "postings": {term: [[doc_idx, tf], ...]}}
+    """
+
+    FILE = "bm25.json"
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: List[str] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+
+    @classmethod
+    def build(cls, docs: Iterable[Tuple[str, str]], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """Index (doc_id, text) pairs."""
+        index = cls(k1, b)
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for doc_id, text in docs:
+            terms = tokenize(text)
+            idx = len(index.ids)
+            index.ids.append(doc_id)
+            index.lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                postings[term].append((idx, tf))
+        index.postings = dict(postings)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def covers(self, query: str) -> bool:
+        """True when every query term occurs in the index, i.e. the query is pure keywords."""
+        terms = tokenize(query)
+        return bool(terms) and all(term in self.postings for term in terms)
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[str, float]]:
+        """Top-k (doc_id, score) for the query terms; empty when no term matches."""
+        n = len(self.ids)
+        if not n:
+            return []
+        avg_len = (sum(self.lengths) / n) or 1.0
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for idx, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[idx] / avg_len)
+                scores[idx] += idf * tf * (self.k1 + 1) / (tf + norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.ids[idx], score) for idx, score in best]
+
+    def save(self, index_dir: Path):
+        data = {
+            "k1": self.k1,
+            "b": self.b,
+            "ids": self.ids,
+            "lengths": self.lengths,
+            "postings": self.postings,
+        }
+        (Path(index_dir) / self.FILE).write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+
+    @classmethod
+    def load(cls, index_dir: Path) -> "BM25Index":
+        data = json.loads((Path(index_dir) / cls.FILE).read_text(encoding="utf-8"))
+        index = cls(data["k1"], data["b"])
+        index.ids = data["ids"]
+        index.lengths = data["lengths"]
+        index.postings = {term: [tuple(p) for p in plist] for term, plist in data["postings"].items()}
+        return index
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[str]:
+    """Fuse ranked id lists: score(d) = sum over lists of 1 / (k + rank)."""
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores, key=lambda doc_id: scores[doc_id], reverse=True)
@@ -0,0 +1,113 @@
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Tuple
+
+from logger.custom_logger import CustomLogger
+
+log = CustomLogger().get_logger(__name__)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True for HTTP 429 / gRPC RESOURCE_EXHAUSTED style errors from the embeddings API."""
+    if getattr(error, "status_code", None) == 429 or getattr(error, "code", None) == 429:
+        return True
+    name = type(error).__name__
+    text = str(error)
+    return (
+        name in ("ResourceExhausted", "TooManyRequests", "RateLimitError")
+        or "429" in text
+        or "RESOURCE_EXHAUSTED" in text
+        or "rate limit" in text.lower()
+    )
+
+
+class EmbeddingBatcher:
+    """
+    Embedding stage for indexing.
+
+    Texts are grouped into batches bounded by `batch_size` texts and `max_batch_chars`
+    characters, and up to `concurrency` batches are sent at once. Rate-limited batches
+    are retried with exponential backoff + jitter. `iter_batches` yields each batch as
+    soon as it completes so the caller can stream vectors into an index.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 100,
+        max_batch_chars: int = 200_000,
+        concurrency: int = 4,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+    ):
+        self.batch_size = max(1, batch_size)
+        self.max_batch_chars = max_batch_chars
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retries = 0
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "EmbeddingBatcher":
+        """Build from the `embedding_pipeline` block of config.yaml (all keys optional)."""
+        block = (config or {}).get("embedding_pipeline") or {}
+        return cls(**{k: v for k, v in block.items() if k in (
+            "batch_size", "max_batch_chars", "concurrency", "max_retries", "backoff_base", "backoff_max",
+        )})
+
+    def make_batches(self, texts: List[str]) -> List[Tuple[int, int]]:
+        """Split texts into [start, end) ranges bounded by count and total characters."""
+        batches = []
+        start = 0
+        chars = 0
+        for i, text in enumerate(texts):
+            if i > start and (i - start >= self.batch_size or chars + len(text) > self.max_batch_chars):
+                batches.append((start, i))
+                start, chars = i, 0
+            chars += len(text)
+        if start < len(texts):
+            batches.append((start, len(texts)))
+        return batches
+
+    def _embed_with_retry(self, embeddings: Any, texts: List[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            try:
+                return embeddings.embed_documents(texts)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_rate_limit_error(e):
+                    raise
+                delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                delay *= 0.5 + random.random() / 2
+                attempt += 1
+                self.retries += 1
+                log.warning("Embedding batch rate limited; backing off",
+                            attempt=attempt, delay=round(delay, 2), size=len(texts))
+                time.sleep(delay)
+
+    def iter_batches(self, embeddings: Any, texts: List[str]) -> Iterator[Tuple[int, List[List[float]]]]:
+        """Yield (start_index, vectors) per batch in completion order."""
+        batches = self.make_batches(texts)
+        if len(batches) <= 1 or self.concurrency == 1:
+            for start, end in batches:
+                yield start, self._embed_with_retry(embeddings, texts[start:end])
+            return
+
+        pending = list(reversed(batches))
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            in_flight = {}
+            try:
+                while pending or in_flight:
+                    while pending and len(in_flight) < self.concurrency:
+                        start, end = pending.pop()
+                        future = pool.submit(self._embed_with_retry, embeddings, texts[start:end])
+                        in_flight[future] = start
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        start = in_flight.pop(future)
+                        yield start, future.result()
+            finally:
+                for future in in_flight:
+                    future.cancel()
@@ -0,0 +1,382 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import faiss  # type: ignore
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore  # type: ignore
+from langchain_community.vectorstores import FAISS  # type: ignore
+
+from exception.custom_exception import DocumentPortalException
+from logger.custom_logger import CustomLogger
+from rag.ann_index import apply_search_params, build_index, index_settings, min_training_points
+from rag.embedding_pipeline import EmbeddingBatcher
+from rag.mmap_store import STORE_FORMAT, MmapVectorStore, is_mmap_store, save_mmap_store
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def documents_hash(documents: List[Any]) -> str:
+    """Content hash of a group of LangChain Documents (page text + source)."""
+    h = hashlib.sha256()
+    for doc in documents:
+        h.update(str(doc.metadata.get("source", "")).encode("utf-8"))
+        h.update(b"\0")
+        h.update(doc.page_content.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+VERSIONS_DIR = "versions"
+CURRENT_FILE = "CURRENT"
+
+
+def read_current_version(faiss_dir: str) -> Optional[str]:
+    """Version name the CURRENT marker points at, or None for an unversioned index."""
+    try:
+        return (Path(faiss_dir) / CURRENT_FILE).read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def resolve_index_dir(faiss_dir: str) -> Tuple[Optional[str], Optional[Path]]:
+    """
+    (version, directory) of the index to read. Versioned layout:
+        <faiss_dir>/CURRENT             -> name of the live version
+        <faiss_dir>/versions/<name>/    -> index files + manifest.json
+    A plain index saved directly in faiss_dir is reported as version "legacy".
+    """
+    root = Path(faiss_dir)
+    version = read_current_version(faiss_dir)
+    if version is not None:
+        return version, root / VERSIONS_DIR / version
+    if (root / "index.faiss").exists():
+        return "legacy", root
+    return None, None
+
+
+def _read_manifest(index_dir: Path) -> Dict[str, Any]:
+    manifest_path = index_dir / FaissIndexManager.MANIFEST_FILE
+    if manifest_path.exists():
+        return json.loads(manifest_path.read_text(encoding="utf-8"))
+    return {}
+
+
+def pickle_index_allowed() -> bool:
+    """Opt-in (RAG_ALLOW_PICKLE_INDEX=1) for loading legacy pickle-based indexes; off by default."""
+    return os.getenv("RAG_ALLOW_PICKLE_INDEX", "").strip().lower() in ("1", "true", "yes")
+
+
+def load_vectorstore(
+    index_dir: Path,
+    embeddings: Any,
+    settings: Optional[Dict[str, Any]] = None,
+    allow_pickle: Optional[bool] = None,
+) -> Any:
+    """
+    Open a saved index for querying. Versions in the mmap format are memory-mapped
+    (MmapVectorStore). Older pickle-based saves are refused unless `allow_pickle`
+    (default: RAG_ALLOW_PICKLE_INDEX) is set, since unpickling a tampered
+    index.pkl executes arbitrary code; convert them once with
+    `python -m rag.index_manager migrate <faiss_dir>`.
+    Query-time knobs (nprobe / efSearch) come from `settings`, or from the index
+    settings recorded in the version's manifest.
+    """
+    manifest = _read_manifest(index_dir)
+    settings = settings or manifest.get("index")
+    if is_mmap_store(manifest):
+        return MmapVectorStore(index_dir, embeddings, settings)
+
+    if not (pickle_index_allowed() if allow_pickle is None else allow_pickle):
+        raise ValueError(
+            f"Refusing to unpickle legacy FAISS index at {index_dir}; run "
+            "`python -m rag.index_manager migrate <faiss_dir>` or set RAG_ALLOW_PICKLE_INDEX=1"
+        )
+    CustomLogger().get_logger(__name__).warning("Loading pickle-based FAISS index; re-save to migrate", path=str(index_dir))
+    vectorstore = FAISS.load_local(str(index_dir), embeddings, allow_dangerous_deserialization=True)
+    if settings:
+        apply_search_params(vectorstore.index, index_settings(settings))
+    return vectorstore
+
+
+class FaissIndexManager:
+    """
+    Owns one on-disk FAISS index plus a manifest of ingested sources.
+
+    Supports incremental updates: new sources are embedded on their own and merged
+    with `add_embeddings`; already-ingested sources (by content hash) are skipped, a
+    source re-ingested under the same name with changed content can replace its old
+    chunks (opt-in, see `add_chunks`), and a source's chunks can be deleted by id.
+    Manifest layout (manifest.json):
+        {"format": "faiss-mmap-v1", "count": int, "dim": int, "index": {<vector_store settings>},
+         "sources": {<sha256>: {"name": str, "chunk_ids": [str], "ingested_at": iso}}}
+
+    Every save writes a new version directory (index.faiss + chunks.sqlite +
+    manifest.json, no pickle) and then atomically repoints the CURRENT marker,
+    so readers never see a half-written index.
+
+    The FAISS index type comes from `index_config` (the `vector_store` block of
+    config.yaml): flat, ivfpq or hnsw. IVF-PQ needs training, so vectors are
+    buffered until `min_training_points` of them (or the save) arrive; an index
+    saved below that stays flat and is rebuilt as IVF-PQ once it reaches the same
+    threshold. Index types that
+    cannot remove ids are rebuilt without the deleted chunks.
+    """
+
+    MANIFEST_FILE = "manifest.json"
+    KEEP_VERSIONS = 2
+
+    def __init__(
+        self,
+        faiss_dir: str,
+        embeddings: Any,
+        batcher: Optional[EmbeddingBatcher] = None,
+        index_config: Optional[Dict[str, Any]] = None,
+    ):
+        self.log = CustomLogger().get_logger(__name__)
+        self.faiss_dir = Path(faiss_dir)
+        self.embeddings = embeddings
+        self.batcher = batcher or EmbeddingBatcher()
+        self.settings = index_settings(index_config)
+        self.vectorstore: Optional[FAISS] = None
+        self.manifest: Dict[str, Any] = {"sources": {}}
+        # rows held back until an IVF-PQ index can be trained: vectors in one
+        # preallocated float32 block, the rest of each row in parallel lists
+        self._pending_vectors: Optional[np.ndarray] = None
+        self._pending_count = 0
+        self._pending_texts: List[str] = []
+        self._pending_metadatas: List[Dict[str, Any]] = []
+        self._pending_ids: List[str] = []
+
+    def exists(self) -> bool:
+        return resolve_index_dir(str(self.faiss_dir))[1] is not None
+
+    def load(self) -> "FaissIndexManager":
+        """Load the existing index and manifest (if any) for appending."""
+        try:
+            version, index_dir = resolve_index_dir(str(self.faiss_dir))
+            if index_dir is not None:
+                store = load_vectorstore(index_dir, self.embeddings, self.settings)
+                if isinstance(store, MmapVectorStore):
+                    # mapped indexes are read-only; updates need an in-memory copy
+                    self.vectorstore = store.to_faiss()
+                    store.close()
+                    apply_search_params(self.vectorstore.index, self.settings)
+                else:
+                    self.vectorstore = store
+                self.manifest = _read_manifest(index_dir) or self.manifest
+            self.log.info("FAISS index loaded for update", path=str(self.faiss_dir), version=version,
+                          sources=len(self.manifest["sources"]))
+            return self
+        except Exception as e:
+            self.log.error("Error loading FAISS index for update", error=str(e))
+            raise DocumentPortalException("Error loading FAISS index for update", sys)
+
+    def has_source(self, source_hash: str) -> bool:
+        return source_hash in self.manifest["sources"]
+
+    def sources_named(self, source_name: str) -> List[str]:
+        """Content hashes ingested under this source name."""
+        return [h for h, entry in self.manifest["sources"].items() if entry.get("name") == source_name]
+
+    def add_chunks(
+        self, chunks: List[Any], source_hash: str, source_name: str = "", replace_existing: bool = False
+    ) -> List[str]:
+        """
+        Embed only these chunks and merge them into the index under stable ids.
+        Embedding batches are streamed into the index as they complete. With
+        replace_existing=True (only for callers whose source_name really identifies
+        the source, e.g. a path) earlier versions of the same source are deleted
+        first, so stale text does not stay searchable.
+        """
+        if not chunks:
+            return []
+        if replace_existing and source_name:
+            for old_hash in self.sources_named(source_name):
+                if old_hash != source_hash:
+                    self.log.info("Source content changed; replacing previous version", source=source_name)
+                    self.delete_source(old_hash)
+        ids = [f"{source_hash[:16]}-{i}" for i in range(len(chunks))]
+        texts = [c.page_content for c in chunks]
+        metadatas = [{**c.metadata, "source_hash": source_hash} for c in chunks]
+
+        train_at = min_training_points(self.settings)
+        for start, vectors in self.batcher.iter_batches(self.embeddings, texts):
+            vectors = np.asarray(vectors, dtype=np.float32)
+            end = start + len(vectors)
+            if self.vectorstore is None and train_at:
+                self._buffer(texts[start:end], vectors, metadatas[start:end], ids[start:end], train_at)
+                if self._pending_count >= train_at:
+                    self._flush_pending()
+            else:
+                self._add_rows(texts[start:end], vectors, metadatas[start:end], ids[start:end])
+
+        self.manifest["sources"][source_hash] = {
+            "name": source_name,
+            "chunk_ids": ids,
+            "ingested_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self.log.info("Chunks added to FAISS index", source=source_name, count=len(ids))
+        return ids
+
+    def _new_store(self, vectors: np.ndarray) -> FAISS:
+        index = build_index(vectors.shape[1], self.settings, vectors)
+        return FAISS(self.embeddings, index, InMemoryDocstore(), {})
+
+    def _add_rows(self, texts: List[str], vectors: np.ndarray, metadatas: List[Dict[str, Any]], ids: List[str]):
+        if not ids:
+            return
+        if self.vectorstore is None:
+            self.vectorstore = self._new_store(vectors)
+        self.vectorstore.add_embeddings(zip(texts, vectors), metadatas=metadatas, ids=ids)
+
+    def _buffer(self, texts: List[str], vectors: np.ndarray, metadatas: List[Dict[str, Any]],
+                ids: List[str], capacity: int):
+        """Append rows to the pending buffer, allocated once at `capacity` x dim."""
+        n, size = self._pending_count, len(vectors)
+        if self._pending_vectors is None:
+            self._pending_vectors = np.empty((max(capacity, size), vectors.shape[1]), dtype=np.float32)
+        elif n + size > len(self._pending_vectors):
+            grown = np.empty((max(2 * len(self._pending_vectors), n + size), vectors.shape[1]), dtype=np.float32)
+            grown[:n] = self._pending_vectors[:n]
+            self._pending_vectors = grown
+        self._pending_vectors[n:n + size] = vectors
+        self._pending_count = n + size
+        self._pending_texts.extend(texts)
+        self._pending_metadatas.extend(metadatas)
+        self._pending_ids.extend(ids)
+
+    def _flush_pending(self):
+        if not self._pending_count:
+            return
+        vectors = self._pending_vectors[:self._pending_count]
+        texts, metadatas, ids = self._pending_texts, self._pending_metadatas, self._pending_ids
+        self._pending_vectors, self._pending_count = None, 0
+        self._pending_texts, self._pending_metadatas, self._pending_ids = [], [], []
+        self._add_rows(texts, vectors, metadatas, ids)
+
+    def _rebuild(self, exclude_ids: Optional[set] = None):
+        """Rebuild the index with the configured type, optionally dropping some chunk ids."""
+        store = self.vectorstore
+        exclude_ids = exclude_ids or set()
+        keep = [(pos, doc_id) for pos, doc_id in sorted(store.index_to_docstore_id.items())
+                if doc_id not in exclude_ids]
+        if not keep:
+            self.vectorstore = FAISS(self.embeddings, faiss.IndexFlatL2(store.index.d), InMemoryDocstore(), {})
+            return
+        docs = [store.docstore.search(doc_id) for _, doc_id in keep]
+        if isinstance(store.index, (faiss.IndexFlat, faiss.IndexHNSWFlat, faiss.IndexRefine)):
+            vectors = store.index.reconstruct_n(0, store.index.ntotal)[[pos for pos, _ in keep]]
+        else:
+            # PQ codes only reconstruct approximately: re-embed (served by the embedding cache)
+            texts = [d.page_content for d in docs]
+            vectors = np.zeros((len(texts), store.index.d), dtype=np.float32)
+            for start, batch in self.batcher.iter_batches(self.embeddings, texts):
+                vectors[start:start + len(batch)] = batch
+        self.vectorstore = None
+        self._add_rows(
+            [d.page_content for d in docs],
+            np.ascontiguousarray(vectors, dtype=np.float32),
+            [d.metadata for d in docs],
+            [doc_id for _, doc_id in keep],
+        )
+        self.log.info("FAISS index rebuilt", index_type=self.settings["index_type"], count=len(keep))
+
+    def delete_source(self, source_hash: str) -> int:
+        """Remove every chunk of one ingested source; returns the number of chunks deleted."""
+        entry = self.manifest["sources"].pop(source_hash, None)
+        if not entry:
+            return 0
+        doomed = set(entry["chunk_ids"])
+        keep = [i for i, doc_id in enumerate(self._pending_ids) if doc_id not in doomed]
+        if len(keep) < self._pending_count:
+            self._pending_vectors[:len(keep)] = self._pending_vectors[keep]
+            self._pending_count = len(keep)
+            self._pending_texts = [self._pending_texts[i] for i in keep]
+            self._pending_metadatas = [self._pending_metadatas[i] for i in keep]
+            self._pending_ids = [self._pending_ids[i] for i in keep]
+        stored = set() if self.vectorstore is None else set(self.vectorstore.index_to_docstore_id.values())
+        in_store = [i for i in entry["chunk_ids"] if i in stored]
+        if in_store:
+            if isinstance(self.vectorstore.index, faiss.IndexFlat):
+                self.vectorstore.delete(in_store)
+            else:
+                self._rebuild(exclude_ids=doomed)
+        self.log.info("Source deleted from FAISS index", source=entry.get("name"), count=len(entry["chunk_ids"]))
+        return len(entry["chunk_ids"])
+
+    def save(self) -> str:
+        """Persist index and manifest as a new version, publish it and return its name."""
+        self._flush_pending()
+        if self.vectorstore is None:
+            raise ValueError("Nothing to save: FAISS index is empty")
+        if (
+            self.settings["index_type"] != "flat"
+            and isinstance(self.vectorstore.index, faiss.IndexFlat)
+            and self.vectorstore.index.ntotal >= min_training_points(self.settings)
+        ):
+            # started flat for lack of training data; now there is enough
+            self._rebuild()
+        self.manifest["index"] = self.settings
+        version = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+        version_dir = self.faiss_dir / VERSIONS_DIR / version
+        version_dir.mkdir(parents=True, exist_ok=True)
+        save_mmap_store(version_dir, self.vectorstore)
+        self.manifest["format"] = STORE_FORMAT
+        self.manifest["count"] = self.vectorstore.index.ntotal
+        self.manifest["dim"] = self.vectorstore.index.d
+        (version_dir / self.MANIFEST_FILE).write_text(json.dumps(self.manifest), encoding="utf-8")
+
+        # publish: write the marker aside, then rename over CURRENT (atomic on POSIX and Windows)
+        tmp = self.faiss_dir / f"{CURRENT_FILE}.{uuid.uuid4().hex}.tmp"
+        tmp.write_text(version, encoding="utf-8")
+        os.replace(tmp, self.faiss_dir / CURRENT_FILE)
+        self.log.info("FAISS index and manifest saved", path=str(self.faiss_dir), version=version)
+        self._prune_versions(keep=version)
+        return version
+
+    def _prune_versions(self, keep: str):
+        """Delete all but the newest KEEP_VERSIONS versions (never the live one)."""
+        versions = sorted(p for p in (self.faiss_dir / VERSIONS_DIR).iterdir() if p.is_dir())
+        for path in versions[:-self.KEEP_VERSIONS]:
+            if path.name != keep:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def as_retriever(self, k: int = 5) -> Any:
+        return self.vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": k})
+
+
+def migrate_legacy_index(faiss_dir: str, embeddings: Any, index_config: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """
+    One-off conversion of a pickle-based index (plain or versioned) to the mmap
+    format. The pickle is trusted here by the operator running the migration.
+    Returns the new version name, or None when there was nothing to migrate.
+    """
+    _, index_dir = resolve_index_dir(faiss_dir)
+    if index_dir is None or is_mmap_store(_read_manifest(index_dir)):
+        return None
+    manager = FaissIndexManager(faiss_dir, embeddings, index_config=index_config)
+    manager.vectorstore = load_vectorstore(index_dir, embeddings, manager.settings, allow_pickle=True)
+    manager.manifest = _read_manifest(index_dir) or manager.manifest
+    manager.manifest.setdefault("sources", {})
+    return manager.save()
+
+
+if __name__ == "__main__":
+    # python -m rag.index_manager migrate [faiss_dir]
+    from utils.model_loader import ModelLoader
+
+    if sys.argv[1:2] != ["migrate"]:
+        sys.exit("usage: python -m rag.index_manager migrate [faiss_dir]")
+    target = sys.argv[2] if len(sys.argv) > 2 else "rag/vectorstore"
+    loader = ModelLoader()
+    migrated = migrate_legacy_index(target, loader.load_embeddings(), loader.config.get("vector_store"))
+    print(f"Migrated {target} to version {migrated}" if migrated else f"Nothing to migrate in {target}")
@@ -0,0 +1,19 @@
+import time
+from typing import Any, Dict, List, Tuple
+
+from langchain_community.document_loaders import PyPDFLoader  # type: ignore
+from langchain_text_splitters import RecursiveCharacterTextSplitter  # type: ignore
+
+
+# Runs inside ProcessPoolExecutor workers: keep this module free of app imports
+# (config, model loader, LangChain chains) so workers start quickly.
+def parse_and_chunk(
+    path: str, chunk_size: int = 1000, chunk_overlap: int = 300
+) -> Tuple[List[Any], Dict[str, float]]:
+    """Load one PDF and split it into chunks; returns (chunks, {"parse": s, "split": s})."""
+    started = time.perf_counter()
+    documents = PyPDFLoader(path).load()
+    parsed = time.perf_counter()
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks = splitter.split_documents(documents)
+    return chunks, {"parse": parsed - started, "split": time.perf_counter() - parsed}
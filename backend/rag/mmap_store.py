@@ -0,0 +1,174 @@
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import faiss  # type: ignore
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore  # type: ignore
+from langchain_community.vectorstores import FAISS  # type: ignore
+from langchain_core.callbacks import CallbackManagerForRetrieverRun  # type: ignore
+from langchain_core.documents import Document  # type: ignore
+from langchain_core.retrievers import BaseRetriever  # type: ignore
+
+from rag.ann_index import apply_search_params, index_settings
+from rag.bm25 import BM25Index, reciprocal_rank_fusion
+
+STORE_FORMAT = "faiss-mmap-v1"
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.sqlite"
+
+# zero-copy mapping of flat/HNSW storage where supported; IVF lists fall back to IO_FLAG_MMAP
+_MMAP_FLAG = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+
+
+def save_mmap_store(index_dir: Path, vectorstore: FAISS):
+    """
+    Write a LangChain FAISS store as raw FAISS index bytes plus a SQLite chunk table
+    (no pickle). Rows are keyed by index position: chunks(pos, doc_id, text, metadata).
+    A BM25 keyword index over the same chunks is written alongside (bm25.json).
+    """
+    faiss.write_index(vectorstore.index, str(index_dir / INDEX_FILE))
+    conn = sqlite3.connect(str(index_dir / CHUNKS_FILE))
+    try:
+        conn.execute(
+            "CREATE TABLE chunks (pos INTEGER PRIMARY KEY, doc_id TEXT NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        rows = []
+        for pos, doc_id in sorted(vectorstore.index_to_docstore_id.items()):
+            doc = vectorstore.docstore.search(doc_id)
+            rows.append((pos, doc_id, doc.page_content, json.dumps(doc.metadata, default=str)))
+        conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", rows)
+        conn.execute("CREATE UNIQUE INDEX chunks_doc_id ON chunks (doc_id)")
+        conn.commit()
+    finally:
+        conn.close()
+    BM25Index.build((doc_id, text) for _, doc_id, text, _ in rows).save(index_dir)
+
+
+def is_mmap_store(manifest: Dict[str, Any]) -> bool:
+    return manifest.get("format") == STORE_FORMAT
+
+
+class MmapVectorStore:
+    """
+    Read-only vector store over one saved version directory.
+
+    The FAISS index is memory-mapped, so every worker process shares one copy
+    through the page cache and opening it is near-instant. Chunk texts are read on
+    demand from SQLite (opened read-only/immutable). Nothing is unpickled.
+    A mapped index must never be added to (FAISS aborts); use `to_faiss()` to get a
+    mutable in-memory copy for updates.
+    """
+
+    def __init__(self, index_dir: Path, embeddings: Any, settings: Optional[Dict[str, Any]] = None):
+        self.index_dir = Path(index_dir)
+        self.embeddings = embeddings
+        self.index = faiss.read_index(str(self.index_dir / INDEX_FILE), _MMAP_FLAG)
+        if settings:
+            apply_search_params(self.index, index_settings(settings))
+        self._conn = sqlite3.connect(
+            f"file:{self.index_dir / CHUNKS_FILE}?mode=ro&immutable=1", uri=True, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        self.bm25 = BM25Index.load(self.index_dir) if (self.index_dir / BM25Index.FILE).exists() else None
+
+    @property
+    def version(self) -> str:
+        return self.index_dir.name
+
+    def get_by_ids(self, doc_ids: List[str]) -> List[Document]:
+        """Chunks for these ids, in the given order (unknown ids are skipped). No index access."""
+        if not doc_ids:
+            return []
+        marks = ",".join("?" * len(doc_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT doc_id, text, metadata FROM chunks WHERE doc_id IN ({marks})", list(doc_ids)
+            ).fetchall()
+        docs = {
+            doc_id: Document(page_content=text, metadata=json.loads(metadata), id=doc_id)
+            for doc_id, text, metadata in rows
+        }
+        return [docs[i] for i in doc_ids if i in docs]
+
+    def _documents(self, positions: List[int]) -> Dict[int, Document]:
+        if not positions:
+            return {}
+        marks = ",".join("?" * len(positions))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT pos, doc_id, text, metadata FROM chunks WHERE pos IN ({marks})", positions
+            ).fetchall()
+        return {
+            pos: Document(page_content=text, metadata=json.loads(metadata), id=doc_id)
+            for pos, doc_id, text, metadata in rows
+        }
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: List[float], k: int = 4
+    ) -> List[Tuple[Document, float]]:
+        query = np.asarray([embedding], dtype=np.float32)
+        scores, positions = self.index.search(query, k)
+        hits = [(int(p), float(s)) for p, s in zip(positions[0], scores[0]) if p != -1]
+        docs = self._documents([p for p, _ in hits])
+        return [(docs[p], s) for p, s in hits if p in docs]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k)
+
+    def hybrid_search(self, query: str, k: int = 4, keyword_only: bool = False) -> List[Document]:
+        """
+        BM25 and dense results fused with reciprocal rank fusion.
+        keyword_only=True allows skipping the dense side (and its embedding call),
+        which happens only when BM25 knows every query term; any other query is
+        still fused.
+        """
+        if self.bm25 is None:
+            return self.similarity_search(query, k)
+        keyword_ids = [doc_id for doc_id, _ in self.bm25.search(query, 2 * k)]
+        if keyword_only and keyword_ids and self.bm25.covers(query):
+            ranked = keyword_ids
+        else:
+            dense = self.similarity_search(query, 2 * k)
+            ranked = reciprocal_rank_fusion([keyword_ids, [d.id for d in dense]])
+        return self.get_by_ids(ranked[:k])
+
+    def as_retriever(self, k: int = 5) -> "MmapRetriever":
+        return MmapRetriever(store=self, k=k)
+
+    def to_faiss(self) -> FAISS:
+        """Load a mutable, fully in-memory LangChain FAISS copy (for appends and deletes)."""
+        index = faiss.read_index(str(self.index_dir / INDEX_FILE))
+        with self._lock:
+            rows = self._conn.execute("SELECT pos, doc_id, text, metadata FROM chunks ORDER BY pos").fetchall()
+        docstore = InMemoryDocstore({
+            doc_id: Document(page_content=text, metadata=json.loads(metadata), id=doc_id)
+            for _, doc_id, text, metadata in rows
+        })
+        return FAISS(self.embeddings, index, docstore, {pos: doc_id for pos, doc_id, _, _ in rows})
+
+    def close(self):
+        """Release the SQLite handle and the mapped index (the store is unusable afterwards)."""
+        with self._lock:
+            self._conn.close()
+            self.index = None
+
+
+class MmapRetriever(BaseRetriever):
+    """Hybrid (BM25 + dense) retriever over a MmapVectorStore."""
+
+    store: Any
+    k: int = 5
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.store.hybrid_search(query, k=self.k)
+
+    def keyword_search(self, query: str, k: Optional[int] = None) -> List[Document]:
+        return self.store.hybrid_search(query, k=k or self.k, keyword_only=True)
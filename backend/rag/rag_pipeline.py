@@ -1,14 +1,16 @@
+import multiprocessing
 import os
 import sys
+import time
 import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import List, Any
+from typing import List, Any, Optional
 
 from dotenv import load_dotenv  # type: ignore
 from langchain_community.document_loaders import PyPDFLoader  # type: ignore
 from langchain_text_splitters import RecursiveCharacterTextSplitter  # type: ignore
-from langchain_community.vectorstores import FAISS  # type: ignore
 from langchain_core.chat_history import BaseChatMessageHistory  # type: ignore
 from langchain_community.chat_message_histories import ChatMessageHistory  # type: ignore
 from langchain_core.runnables.history import RunnableWithMessageHistory  # type: ignore
@@ -16,12 +18,20 @@ from langchain.chains import create_history_aware_retriever, create_retrieval_ch
 from langchain.chains.combine_documents import create_stuff_documents_chain  # type: ignore
 
 from utils.model_loader import ModelLoader
+from rag.embedding_pipeline import EmbeddingBatcher
+from rag.index_manager import FaissIndexManager, sha256_bytes, documents_hash
+from rag.ingest_workers import parse_and_chunk
+from rag.vectorstore_registry import RegistryRetriever, vectorstore_registry
 from exception.custom_exception import DocumentPortalException
 from logger.custom_logger import CustomLogger
 from prompts.prompt_lib import PROMPT_REGISTRY  
 from model.models import PromptType
 
 
+def _load_embeddings():
+    return ModelLoader().load_embeddings()
+
+
 class SingleDocumentIngestor:
     """
     Ingests one or more uploaded PDFs, builds a FAISS index locally,
@@ -38,6 +48,7 @@ class SingleDocumentIngestor:
             self.faiss_dir.mkdir(parents=True, exist_ok=True)
 
             self.model_loader = ModelLoader()
+            self.last_timings = {}
 
             self.log.info(
                 "SingleDocumentIngestor initialized successfully",
@@ -48,47 +59,139 @@ class SingleDocumentIngestor:
             print(f"Error initializing SingleDocumentIngestor: {e}")
             raise DocumentPortalException("Initialization error in SingleDocumentIngestor", sys)
 
-    def ingest_files(self, uploaded_files) -> Any:
+    def ingest_files(
+        self,
+        uploaded_files,
+        append: bool = False,
+        parallel: bool = False,
+        max_workers: Optional[int] = None,
+    ) -> Any:
         """
         Save incoming PDFs to temp dir, load pages as Documents, chunk, embed, save FAISS, return retriever.
+        With append=True the existing index is extended: only files whose content hash is not
+        in the manifest are embedded, and their chunks are merged into the saved index.
+        With parallel=True files are parsed and chunked in a process pool while the chunks
+        of finished files are embedded on a background thread; see `_ingest_parallel`.
         """
         try:
-            documents = []
-
+            saved = []
             for uploaded_file in uploaded_files:
+                data = bytes(uploaded_file.getbuffer())
+                file_hash = sha256_bytes(data)
                 unique_file_name = f"session_{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex}.pdf"
                 temp_path = self.data_dir / unique_file_name
                 with open(temp_path, "wb") as f_out:
-                    f_out.write(uploaded_file.getbuffer())
+                    f_out.write(data)
                 self.log.info("PDF saved for ingestion", filename=getattr(uploaded_file, "name", unique_file_name))
+                saved.append((file_hash, getattr(uploaded_file, "name", unique_file_name), temp_path))
+
+            if parallel:
+                return self._ingest_parallel(saved, append=append, max_workers=max_workers)
+
+            documents_by_file = []
+            for file_hash, file_name, temp_path in saved:
                 loader = PyPDFLoader(str(temp_path))
-                docs = loader.load()
-                documents.extend(docs)
+                documents_by_file.append((file_hash, file_name, loader.load()))
 
-            self.log.info("PDF files loaded", count=len(documents))
-            return self._create_retriever(documents)
+            self.log.info("PDF files loaded", count=sum(len(d) for _, _, d in documents_by_file))
+            return self._create_retriever(documents_by_file, append=append)
 
         except Exception as e:
             self.log.error("Document Ingestion Failed", error=str(e))
             raise DocumentPortalException("Error ingesting files", sys)
 
-    def _create_retriever(self, documents):
+    def _ingest_parallel(self, saved, append: bool = False, max_workers: Optional[int] = None):
+        """
+        Parse + chunk saved PDFs in a ProcessPoolExecutor and overlap embedding with parsing.
+        At most 2 * max_workers files are queued in the pool at once; each finished file is
+        handed to a single embedding thread that merges it into the index.
+        Per-stage timings are logged and kept on `self.last_timings`.
+        saved: [(file_hash, file_name, temp_path), ...]
+        """
+        started = time.perf_counter()
+        workers = max_workers or os.cpu_count() or 1
+        timings = {"parse": 0.0, "split": 0.0, "embed": 0.0, "save": 0.0}
+
+        manager = self._index_manager()
+        if append:
+            manager.load()
+        pending = []
+        seen = set()  # byte-identical files within this upload are embedded once
+        for file_hash, file_name, temp_path in saved:
+            if manager.has_source(file_hash) or file_hash in seen:
+                self.log.info("File already indexed; skipping", filename=file_name)
+            else:
+                seen.add(file_hash)
+                pending.append((file_hash, file_name, temp_path))
+        pending.reverse()
+
+        def embed(chunks, file_hash, file_name):
+            t0 = time.perf_counter()
+            manager.add_chunks(chunks, file_hash, file_name)
+            timings["embed"] += time.perf_counter() - t0
+
+        chunk_count = 0
+        # spawn, not fork: this process holds gRPC channels (embeddings client) and live threads
+        spawn = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=spawn) as pool, \
+                ThreadPoolExecutor(max_workers=1) as embedder:
+            in_flight = {}
+            embed_jobs = []
+            while pending or in_flight:
+                while pending and len(in_flight) < 2 * workers:
+                    file_hash, file_name, temp_path = pending.pop()
+                    future = pool.submit(parse_and_chunk, str(temp_path))
+                    in_flight[future] = (file_hash, file_name)
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_hash, file_name = in_flight.pop(future)
+                    chunks, stage = future.result()
+                    timings["parse"] += stage["parse"]
+                    timings["split"] += stage["split"]
+                    chunk_count += len(chunks)
+                    self.log.info("Documents split into chunks", filename=file_name, count=len(chunks))
+                    embed_jobs.append(embedder.submit(embed, chunks, file_hash, file_name))
+            for job in embed_jobs:
+                job.result()
+
+        t0 = time.perf_counter()
+        manager.save()
+        timings["save"] = time.perf_counter() - t0
+        timings["total"] = time.perf_counter() - started
+        self.last_timings = {k: round(v, 3) for k, v in timings.items()}
+        self.log.info(
+            "Parallel ingestion finished",
+            files=len(saved),
+            chunks=chunk_count,
+            workers=workers,
+            timings=self.last_timings,
+        )
+        return manager.as_retriever(k=5)
+
+    def _create_retriever(self, documents_by_file, append: bool = False):
         """
-        Split documents, create FAISS, persist, return similarity retriever (k=5).
+        Split documents, create (or extend) FAISS, persist, return similarity retriever (k=5).
+        documents_by_file: [(file_hash, file_name, [Document, ...]), ...]
         """
         try:
             splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=300)
-            chunks = splitter.split_documents(documents)
-            self.log.info("Documents split into chunks", count=len(chunks))
+            manager = self._index_manager()
+            if append:
+                manager.load()
 
-            embeddings = self.model_loader.load_embeddings()
-            vectorstore = FAISS.from_documents(documents=chunks, embedding=embeddings)
+            for file_hash, file_name, documents in documents_by_file:
+                if manager.has_source(file_hash):
+                    self.log.info("File already indexed; skipping", filename=file_name)
+                    continue
+                chunks = splitter.split_documents(documents)
+                self.log.info("Documents split into chunks", filename=file_name, count=len(chunks))
+                manager.add_chunks(chunks, file_hash, file_name)
 
             # Save FAISS index to disk
-            vectorstore.save_local(str(self.faiss_dir))
+            manager.save()
             self.log.info("FAISS index created and saved", path=str(self.faiss_dir))
 
-            retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 5})
+            retriever = manager.as_retriever(k=5)
             self.log.info("Retriever created successfully")
             return retriever
 
@@ -96,6 +199,26 @@ class SingleDocumentIngestor:
             self.log.error("Error creating retriever", error=str(e))
             raise DocumentPortalException("Error creating FAISS retriever", sys)
 
+    def _index_manager(self) -> FaissIndexManager:
+        return FaissIndexManager(
+            str(self.faiss_dir),
+            self.model_loader.load_embeddings(),
+            EmbeddingBatcher.from_config(self.model_loader.config),
+            self.model_loader.config.get("vector_store"),
+        )
+
+    def delete_document(self, file_hash: str) -> int:
+        """Remove one ingested PDF's chunks (by content hash) from the saved index."""
+        try:
+            manager = self._index_manager().load()
+            deleted = manager.delete_source(file_hash)
+            if deleted:
+                manager.save()
+            return deleted
+        except Exception as e:
+            self.log.error("Error deleting document from index", error=str(e))
+            raise DocumentPortalException("Error deleting document from FAISS index", sys)
+
 
 class ConversationalRAG:
     """
@@ -137,47 +260,75 @@ class ConversationalRAG:
 
     def load_retriever_from_faiss(self) -> Any:
         """
-        Load an on-disk FAISS index and return a similarity retriever (k=5).
+        Return a similarity retriever (k=5) over the on-disk FAISS index.
+        The index is loaded once per process through the vector store registry and
+        hot-reloaded when a new version is published, so repeat calls are free.
         """
         try:
-            embeddings = ModelLoader().load_embeddings()
             if not os.path.isdir(self.faiss_dir):
                 raise FileNotFoundError(f"FAISS index directory not found at {self.faiss_dir}")
 
-            # allow_dangerous_deserialization=True to avoid LC pickling guard issues
-            vectorstore = FAISS.load_local(self.faiss_dir, embeddings, allow_dangerous_deserialization=True)
-            self.log.info("FAISS retriever loaded successfully", index_path=self.faiss_dir)
-            return vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 5})
+            vectorstore_registry.get(self.faiss_dir, _load_embeddings)
+            self.log.info("FAISS retriever ready", index_path=self.faiss_dir,
+                          version=vectorstore_registry.version(self.faiss_dir))
+            return RegistryRetriever(faiss_dir=self.faiss_dir, embeddings_factory=_load_embeddings, k=5)
 
         except Exception as e:
             self.log.error("Error loading FAISS retriever", error=str(e))
             raise DocumentPortalException("Error loading FAISS retriever", sys)
 
-    def index_documents(self, documents: List[Any]):
+    def index_documents(self, documents: List[Any], append: bool = False):
         """
         Index documents and save FAISS vectorstore.
+        Documents are grouped by their `source` metadata; with append=True only groups
+        whose content hash is new are embedded and merged into the existing index.
         """
         try:
-            embeddings = ModelLoader().load_embeddings()
-            vectorstore = FAISS.from_documents(documents=documents, embedding=embeddings)
+            model_loader = ModelLoader()
+            manager = FaissIndexManager(
+                self.faiss_dir,
+                model_loader.load_embeddings(),
+                EmbeddingBatcher.from_config(model_loader.config),
+                model_loader.config.get("vector_store"),
+            )
+            if append:
+                manager.load()
+            
+            groups = {}
+            for doc in documents:
+                groups.setdefault(str(doc.metadata.get("source", "")), []).append(doc)
+            
+            added = 0
+            for source, docs in groups.items():
+                source_hash = documents_hash(docs)
+                if manager.has_source(source_hash):
+                    continue
+                # `source` is a path/URI, so a new hash under it is a new version of that source
+                added += len(manager.add_chunks(docs, source_hash, source, replace_existing=bool(source)))
             
             # Create directory if it doesn't exist
             os.makedirs(self.faiss_dir, exist_ok=True)
-            vectorstore.save_local(self.faiss_dir)
+            manager.save()
             
-            self.log.info("Documents indexed and saved", count=len(documents), path=self.faiss_dir)
-            return vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 5})
+            self.log.info("Documents indexed and saved", count=added, path=self.faiss_dir)
+            return manager.as_retriever(k=5)
         except Exception as e:
             self.log.error("Error indexing documents", error=str(e))
             raise DocumentPortalException("Error indexing documents", sys)
 
-    def search(self, retriever: Any, query: str, k: int = 5) -> List[str]:
+    def search(self, retriever: Any, query: str, k: int = 5, keyword_only: bool = False) -> List[str]:
         """
         Search for relevant chunks using the retriever.
+        keyword_only=True lets retrievers with a BM25 index answer a pure keyword query
+        (every term in the BM25 vocabulary) without the query embedding call; other
+        queries are still fused, and retrievers without BM25 ignore it.
         Returns list of chunk texts.
         """
         try:
-            docs = retriever.get_relevant_documents(query)
+            if keyword_only and hasattr(retriever, "keyword_search"):
+                docs = retriever.keyword_search(query, k)
+            else:
+                docs = retriever.invoke(query)
             chunks = [doc.page_content for doc in docs[:k]]
             self.log.info("Search completed", query=query[:50], chunks_found=len(chunks))
             return chunks
@@ -243,13 +394,20 @@ class ConversationalRAG:
                     context_tags: List[str], duration_hint: str) -> dict:
         """
         Complete exercise recommendation pipeline.
+        Common requests are served from the precomputed exercise catalogue; only
+        unusual context tags go through retrieval + LLM synthesis.
         """
+        from core.exercise_catalogue import get_catalogue
+        exercise = get_catalogue().lookup(target_facets, context_tags, duration_hint)
+        if exercise is not None:
+            return exercise
+
         # Build query
         query_parts = target_facets + context_tags + [duration_hint, "exercise"]
         query = " ".join(query_parts)
         
-        # Search and synthesize
-        chunks = self.search(retriever, query, k=5)
+        # Search and synthesize; BM25 alone answers it only when it knows every term
+        chunks = self.search(retriever, query, k=5, keyword_only=True)
         exercise = self.synthesize_exercise(chunks, target_facets, context_tags, duration_hint)
         
         # Validate and prepare
@@ -0,0 +1,190 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun  # type: ignore
+from langchain_core.documents import Document  # type: ignore
+from langchain_core.retrievers import BaseRetriever  # type: ignore
+
+from logger.custom_logger import CustomLogger
+from rag.index_manager import load_vectorstore, resolve_index_dir
+from utils.ttl_cache import TTLCache
+
+log = CustomLogger().get_logger(__name__)
+
+
+class _Entry:
+    __slots__ = ("version", "store", "embeddings", "checked_at", "reloading")
+
+    def __init__(self, embeddings: Any):
+        self.version: Optional[str] = None
+        self.store: Any = None
+        self.embeddings = embeddings
+        self.checked_at = 0.0
+        self.reloading = False
+
+
+class VectorStoreRegistry:
+    """
+    Process-wide cache of loaded vector stores, one per faiss_dir.
+
+    Each `get()` re-reads the CURRENT version marker at most every `check_interval`
+    seconds. When it has moved, the new version is loaded on a background thread
+    and swapped in once complete; until then callers keep getting the previous
+    store, so no request waits on a reload or sees a half-loaded index. Only the
+    very first load of a directory is synchronous (call `get()` at startup to warm it).
+    A replaced store is closed (SQLite handle, mapped index) `retire_grace` seconds
+    after the swap, once queries that already hold it have finished.
+    """
+
+    def __init__(self, check_interval: float = 2.0, query_cache_size: int = 4096, query_cache_ttl: float = 86400.0,
+                 retire_grace: float = 30.0):
+        self.check_interval = check_interval
+        self.retire_grace = retire_grace
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.RLock()
+        self.loads = 0
+        # (faiss_dir, version, mode, k, query) -> top-k chunk ids
+        self.query_cache = TTLCache(maxsize=query_cache_size, ttl=query_cache_ttl)
+        self.query_hits = 0
+        self.query_misses = 0
+
+    @staticmethod
+    def _key(faiss_dir: str) -> str:
+        return str(Path(faiss_dir).resolve())
+
+    def _load(self, key: str, entry: _Entry, version: str, index_dir: Path):
+        started = time.perf_counter()
+        store = load_vectorstore(index_dir, entry.embeddings)
+        with self._lock:
+            old_store = entry.store
+            entry.store, entry.version = store, version
+            self.loads += 1
+            if old_store is not None:
+                # versioned keys already miss; this just frees the stale entries
+                self.query_cache.clear()
+        log.info("Vector store loaded", path=key, version=version,
+                 seconds=round(time.perf_counter() - started, 3))
+        if old_store is not None and hasattr(old_store, "close"):
+            self._retire(old_store)
+
+    def _retire(self, store: Any):
+        """Close a replaced store after the grace period; its version dir may already be pruned."""
+        timer = threading.Timer(self.retire_grace, self._close, args=(store,))
+        timer.daemon = True
+        timer.start()
+
+    @staticmethod
+    def _close(store: Any):
+        try:
+            store.close()
+        except Exception as e:
+            log.warning("Closing retired vector store failed", error=str(e))
+
+    def _reload(self, key: str, entry: _Entry, version: str, index_dir: Path):
+        try:
+            self._load(key, entry, version, index_dir)
+        except Exception as e:
+            log.error("Vector store reload failed; keeping previous version",
+                      path=key, version=version, error=str(e))
+        finally:
+            entry.reloading = False
+
+    def get(self, faiss_dir: str, embeddings_factory: Callable[[], Any]) -> Any:
+        """Return the loaded vector store for faiss_dir, scheduling a reload if the version changed."""
+        key = self._key(faiss_dir)
+        entry = self._entries.get(key)
+        if entry is not None and entry.store is not None and time.monotonic() - entry.checked_at < self.check_interval:
+            return entry.store
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry(embeddings_factory())
+            entry.checked_at = time.monotonic()
+            version, index_dir = resolve_index_dir(key)
+            if entry.store is not None:
+                if index_dir is not None and version != entry.version and not entry.reloading:
+                    entry.reloading = True
+                    threading.Thread(
+                        target=self._reload, args=(key, entry, version, index_dir), daemon=True
+                    ).start()
+                return entry.store
+            if index_dir is None:
+                raise FileNotFoundError(f"FAISS index directory not found at {faiss_dir}")
+            # cold start: nothing to serve yet, so load synchronously (once, under the lock)
+            self._load(key, entry, version, index_dir)
+            return entry.store
+
+    def version(self, faiss_dir: str) -> Optional[str]:
+        entry = self._entries.get(self._key(faiss_dir))
+        return entry.version if entry else None
+
+    def is_stale(self, faiss_dir: str) -> bool:
+        """True when the on-disk CURRENT marker differs from the loaded version."""
+        key = self._key(faiss_dir)
+        entry = self._entries.get(key)
+        return entry is None or resolve_index_dir(key)[0] != entry.version
+
+    def search(self, faiss_dir: str, embeddings_factory: Callable[[], Any], query: str,
+               k: int = 5, keyword_only: bool = False) -> List[Document]:
+        """
+        Top-k chunks for a query, served from the query cache when the same query was
+        already answered by the current index version: a hit costs one SQLite lookup
+        and never touches the embedder or the FAISS index.
+        """
+        store = self.get(faiss_dir, embeddings_factory)
+        if not hasattr(store, "hybrid_search"):
+            return store.similarity_search(query, k=k)
+
+        key = (self._key(faiss_dir), store.version, keyword_only, k, " ".join(query.lower().split()))
+        ids = self.query_cache.get(key)
+        if ids is not None:
+            self.query_hits += 1
+            return store.get_by_ids(ids)
+        self.query_misses += 1
+        docs = store.hybrid_search(query, k=k, keyword_only=keyword_only)
+        self.query_cache.set(key, [d.id for d in docs])
+        return docs
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loads": self.loads,
+            "stores": {path: e.version for path, e in self._entries.items()},
+            "query_cache": {"hits": self.query_hits, "misses": self.query_misses, "size": len(self.query_cache)},
+        }
+
+
+vectorstore_registry = VectorStoreRegistry(
+    query_cache_size=int(os.getenv("RAG_QUERY_CACHE_SIZE", "4096")),
+    query_cache_ttl=float(os.getenv("RAG_QUERY_CACHE_TTL", "86400")),
+)
+
+
+class RegistryRetriever(BaseRetriever):
+    """
+    Retriever that resolves the vector store through the registry on every query,
+    so it follows hot reloads without being rebuilt. Stores with a keyword index
+    are searched hybrid (BM25 + dense, RRF) through the registry's query cache;
+    older stores fall back to dense only.
+    """
+
+    faiss_dir: str
+    embeddings_factory: Callable[[], Any]
+    k: int = 5
+    registry: Any = None
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self._search(query, self.k, keyword_only=False)
+
+    def keyword_search(self, query: str, k: Optional[int] = None) -> List[Document]:
+        """Hybrid search that skips the embedding call when BM25 covers every query term."""
+        return self._search(query, k or self.k, keyword_only=True)
+
+    def _search(self, query: str, k: int, keyword_only: bool) -> List[Document]:
+        registry = self.registry or vectorstore_registry
+        return registry.search(self.faiss_dir, self.embeddings_factory, query, k=k, keyword_only=keyword_only)
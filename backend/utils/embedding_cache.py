@@ -0,0 +1,196 @@
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from logger.custom_logger import CustomLogger
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: single-process use only
+    fcntl = None
+
+log = CustomLogger().get_logger(__name__)
+
+
+def embedding_key(model: str, text: str, kind: str = "document") -> str:
+    """
+    Content address of one embedding: sha256 over model name, text and kind.
+    Query and document embeddings are keyed apart since some models (Gemini's
+    task_type) embed them differently.
+    """
+    h = hashlib.sha256(model.encode("utf-8"))
+    h.update(b"\0")
+    h.update(kind.encode("utf-8"))
+    h.update(b"\0")
+    h.update(text.encode("utf-8"))
+    return h.hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Append-only on-disk vector store.
+
+    Layout in `path`:
+        vectors.f32  raw float32 vectors, back to back (read through np.memmap)
+        index.tsv    one "<key>\\t<offset>\\t<dim>" line per vector, offset in floats
+        .lock        flock target so several workers can append safely
+    Lookups are a dict hit plus a memmap slice. Entries appended by other
+    processes are picked up by re-reading the tail of index.tsv on a miss.
+    """
+
+    VECTORS_FILE = "vectors.f32"
+    INDEX_FILE = "index.tsv"
+    LOCK_FILE = ".lock"
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._vectors_path = self.path / self.VECTORS_FILE
+        self._index_path = self.path / self.INDEX_FILE
+        self._lock_path = self.path / self.LOCK_FILE
+        self._index: Dict[str, Tuple[int, int]] = {}
+        self._index_pos = 0
+        self._mmap: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        self._vectors_path.touch(exist_ok=True)
+        self._index_path.touch(exist_ok=True)
+        with self._lock:
+            self._refresh_index()
+        log.info("Embedding cache opened", path=str(self.path), entries=len(self._index))
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _refresh_index(self):
+        """Read index lines appended since the last refresh (by us or another process)."""
+        with open(self._index_path, "rb") as f:
+            f.seek(self._index_pos)
+            data = f.read()
+        # only consume complete lines; a concurrent writer may be mid-append
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            key, offset, dim = line.decode("ascii").split("\t")
+            self._index[key] = (int(offset), int(dim))
+        self._index_pos += end
+
+    def _vectors(self) -> np.ndarray:
+        size = self._vectors_path.stat().st_size // 4
+        if self._mmap is None or self._mmap.shape[0] < size:
+            self._mmap = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(size,)) if size else None
+        return self._mmap
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        with self._lock:
+            if any(k not in self._index for k in keys):
+                self._refresh_index()
+            vectors = self._vectors()
+            out: List[Optional[List[float]]] = []
+            for key in keys:
+                entry = self._index.get(key)
+                if entry is None or vectors is None or entry[0] + entry[1] > vectors.shape[0]:
+                    out.append(None)
+                else:
+                    offset, dim = entry
+                    out.append(vectors[offset:offset + dim].tolist())
+            return out
+
+    def put_many(self, items: List[Tuple[str, List[float]]]):
+        if not items:
+            return
+        with self._lock, open(self._lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh_index()
+                items = [(k, v) for k, v in items if k not in self._index]
+                if not items:
+                    return
+                lines = []
+                with open(self._vectors_path, "ab") as vf:
+                    offset = vf.tell() // 4
+                    for key, vector in items:
+                        arr = np.asarray(vector, dtype=np.float32)
+                        vf.write(arr.tobytes())
+                        lines.append(f"{key}\t{offset}\t{arr.shape[0]}\n")
+                        offset += arr.shape[0]
+                    vf.flush()
+                    os.fsync(vf.fileno())
+                # index lines are written only after their vectors are on disk
+                with open(self._index_path, "ab") as xf:
+                    xf.write("".join(lines).encode("ascii"))
+                self._refresh_index()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+_stores: Dict[str, EmbeddingStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_embedding_store(path: str) -> EmbeddingStore:
+    """One EmbeddingStore per directory per process."""
+    key = str(Path(path).resolve())
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = EmbeddingStore(key)
+        return store
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    LangChain Embeddings wrapper that serves previously seen texts from an
+    EmbeddingStore and only sends cache misses (deduplicated) to the wrapped model.
+    Other attributes are delegated to the wrapped embedder.
+    """
+
+    def __init__(self, embeddings: Any, model_name: str, store: EmbeddingStore):
+        self._embeddings = embeddings
+        self._model_name = model_name
+        self._store = store
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [embedding_key(self._model_name, t) for t in texts]
+        results = self._store.get_many(keys)
+
+        missing: Dict[str, str] = {}
+        for key, text, vector in zip(keys, texts, results):
+            if vector is None:
+                missing.setdefault(key, text)
+        self.hits += len(texts) - sum(1 for r in results if r is None)
+        self.misses += len(missing)
+
+        if missing:
+            fresh = self._embeddings.embed_documents(list(missing.values()))
+            # round through float32 so a miss returns exactly what later hits will
+            computed = {k: np.asarray(v, dtype=np.float32).tolist() for k, v in zip(missing.keys(), fresh)}
+            self._store.put_many(list(computed.items()))
+            results = [r if r is not None else computed[k] for k, r in zip(keys, results)]
+        return results
+
+    def embed_query(self, text: str) -> List[float]:
+        key = embedding_key(self._model_name, text, kind="query")
+        vector = self._store.get_many([key])[0]
+        if vector is not None:
+            self.hits += 1
+            return vector
+        self.misses += 1
+        vector = np.asarray(self._embeddings.embed_query(text), dtype=np.float32).tolist()
+        self._store.put_many([(key, vector)])
+        return vector
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._store)}
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._embeddings, name)
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import os
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from logger.custom_logger import CustomLogger
+
+log = CustomLogger().get_logger(__name__)
+
+try:
+    import h2  # noqa: F401  # type: ignore
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/models"
+
+
+class GeminiAPIError(Exception):
+    """Raised when the Gemini REST API answers with a non-200 status or an unexpected body."""
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class GeminiClient:
+    """
+    Asynchronous Gemini REST client backed by one shared httpx connection pool.
+
+    - keep-alive pool sized by max_connections / max_keepalive
+    - HTTP/2 when the `h2` package is installed
+    - a concurrency cap on in-flight requests to the Gemini host
+    - separate connect / read / write / pool timeouts
+    The underlying httpx.AsyncClient is created lazily on first use and must be
+    released with `aclose()` on shutdown.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "gemini-1.5-flash",
+        base_url: str = GEMINI_BASE_URL,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        write_timeout: float = 10.0,
+        pool_timeout: float = 5.0,
+        max_connections: int = 100,
+        max_keepalive: int = 20,
+        max_concurrency: int = 64,
+    ):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.timeout = httpx.Timeout(
+            connect=connect_timeout, read=read_timeout, write=write_timeout, pool=pool_timeout
+        )
+        self.limits = httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_keepalive
+        )
+        self.max_concurrency = max_concurrency
+        self._client: Optional[httpx.AsyncClient] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    @classmethod
+    def from_env(cls) -> "GeminiClient":
+        """Build a client from GEMINI_* environment variables."""
+        return cls(
+            api_key=os.getenv("GEMINI_API_KEY", ""),
+            model=os.getenv("GEMINI_MODEL", "gemini-1.5-flash"),
+            connect_timeout=float(os.getenv("GEMINI_CONNECT_TIMEOUT", "5")),
+            read_timeout=float(os.getenv("GEMINI_READ_TIMEOUT", "30")),
+            max_connections=int(os.getenv("GEMINI_MAX_CONNECTIONS", "100")),
+            max_keepalive=int(os.getenv("GEMINI_MAX_KEEPALIVE", "20")),
+            max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "64")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.api_key)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=_HTTP2_AVAILABLE,
+                timeout=self.timeout,
+                limits=self.limits,
+                headers={"x-goog-api-key": self.api_key},
+            )
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            log.info(
+                "Gemini HTTP client created",
+                model=self.model,
+                http2=_HTTP2_AVAILABLE,
+                max_connections=self.limits.max_connections,
+                max_concurrency=self.max_concurrency,
+            )
+        return self._client
+
+    @staticmethod
+    def build_payload(prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {"contents": [{"parts": [{"text": prompt}]}]}
+        if generation_config:
+            payload["generationConfig"] = generation_config
+        return payload
+
+    @staticmethod
+    def extract_text(data: Dict[str, Any]) -> str:
+        try:
+            parts = data["candidates"][0]["content"]["parts"]
+        except (KeyError, IndexError, TypeError):
+            raise GeminiAPIError("Unexpected Gemini response shape")
+        return "".join(p.get("text", "") for p in parts)
+
+    async def generate(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> str:
+        """Send one generateContent request and return the candidate text."""
+        client = self._get_client()
+        async with self._slots:
+            response = await client.post(
+                f"/{self.model}:generateContent",
+                json=self.build_payload(prompt, generation_config),
+            )
+        if response.status_code != 200:
+            raise GeminiAPIError(
+                f"Gemini returned HTTP {response.status_code}", status_code=response.status_code
+            )
+        return self.extract_text(response.json())
+
+    async def stream_generate(
+        self, prompt: str, generation_config: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream a completion via streamGenerateContent (SSE) and yield text fragments
+        as they arrive. The concurrency slot is held for the lifetime of the stream.
+        """
+        client = self._get_client()
+        async with self._slots:
+            async with client.stream(
+                "POST",
+                f"/{self.model}:streamGenerateContent",
+                params={"alt": "sse"},
+                json=self.build_payload(prompt, generation_config),
+            ) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    raise GeminiAPIError(
+                        f"Gemini returned HTTP {response.status_code}", status_code=response.status_code
+                    )
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if not data:
+                        continue
+                    try:
+                        text = self.extract_text(json.loads(data))
+                    except (ValueError, GeminiAPIError):
+                        # e.g. a final chunk that only carries finishReason / usage
+                        continue
+                    if text:
+                        yield text
+
+    async def aclose(self):
+        """Close the shared connection pool."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._slots = None
+            log.info("Gemini HTTP client closed")
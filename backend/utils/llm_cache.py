@@ -0,0 +1,124 @@
+import hashlib
+import json
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from logger.custom_logger import CustomLogger
+from utils.ttl_cache import TTLCache
+
+log = CustomLogger().get_logger(__name__)
+
+
+def make_cache_key(model: str, prompt: Any, params: Optional[Dict[str, Any]] = None) -> str:
+    """Content address of an LLM call: sha256 over model name, prompt and generation params."""
+    blob = json.dumps(
+        {"model": model, "prompt": prompt, "params": params or {}},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class CacheBackend(ABC):
+    """Interface for the shared (cross-process) cache tier."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl: float):
+        ...
+
+
+class MongoCacheBackend(CacheBackend):
+    """Shared cache tier stored in the app's MongoDB, expired by a TTL index on `expires_at`."""
+
+    def __init__(self, collection_name: str = "llm_cache"):
+        self.collection_name = collection_name
+        self._indexed = False
+
+    async def _collection(self):
+        from db import get_collection
+        coll = await get_collection(self.collection_name)
+        if not self._indexed:
+            await coll.create_index("expires_at", expireAfterSeconds=0)
+            self._indexed = True
+        return coll
+
+    async def get(self, key: str) -> Optional[str]:
+        coll = await self._collection()
+        doc = await coll.find_one({"_id": key}, {"value": 1, "expires_at": 1})
+        if not doc:
+            return None
+        # the TTL monitor only runs once a minute, so double-check expiry here
+        expires_at = doc.get("expires_at")
+        if expires_at is not None:
+            if expires_at.tzinfo is None:
+                expires_at = expires_at.replace(tzinfo=timezone.utc)
+            if expires_at < datetime.now(timezone.utc):
+                return None
+        return doc.get("value")
+
+    async def set(self, key: str, value: str, ttl: float):
+        coll = await self._collection()
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+        await coll.replace_one(
+            {"_id": key}, {"_id": key, "value": value, "expires_at": expires_at}, upsert=True
+        )
+
+
+class LLMResponseCache:
+    """
+    Two-tier LLM response cache.
+      - local: in-process LRU with TTL (microsecond hits)
+      - shared: optional CacheBackend (e.g. Mongo) shared between workers
+    Shared-tier failures are logged and treated as misses so the LLM path always works.
+    """
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 3600.0, shared: Optional[CacheBackend] = None):
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.shared = shared
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self.local.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        if self.shared is not None:
+            try:
+                value = await self.shared.get(key)
+            except Exception as e:
+                log.error("Shared LLM cache read failed", error=str(e))
+                value = None
+            if value is not None:
+                self.hits += 1
+                self.shared_hits += 1
+                self.local.set(key, value)
+                return value
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str):
+        self.local.set(key, value)
+        if self.shared is not None:
+            try:
+                await self.shared.set(key, value, self.ttl)
+            except Exception as e:
+                log.error("Shared LLM cache write failed", error=str(e))
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "local_size": len(self.local),
+        }
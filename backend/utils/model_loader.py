@@ -4,11 +4,99 @@ from dotenv import load_dotenv
 from utils.config_loader import load_config
 from langchain_google_genai import GoogleGenerativeAI, ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from langchain_groq import ChatGroq
+from langchain_core.runnables import Runnable
 from logger.custom_logger import CustomLogger
 from exception.custom_exception import DocumentPortalException
+from utils.embedding_cache import CachedEmbeddings, get_embedding_store
+from utils.llm_cache import make_cache_key
+from utils.singleflight import SingleFlight, ThreadSingleFlight
 
 log = CustomLogger().get_logger(__name__)
 
+
+def _messages_fingerprint(messages):
+    """Stable, JSON-friendly view of an LLM input (str, PromptValue, messages or role dicts)."""
+    if hasattr(messages, "to_messages"):
+        messages = messages.to_messages()
+    if isinstance(messages, str):
+        return messages
+    out = []
+    for m in messages:
+        if isinstance(m, dict):
+            out.append([m.get("role"), m.get("content")])
+        elif isinstance(m, (tuple, list)):
+            out.append(list(m))
+        else:
+            out.append([getattr(m, "type", type(m).__name__), getattr(m, "content", str(m))])
+    return out
+
+
+class CoalescedLLM(Runnable):
+    """
+    Runnable wrapper around a LangChain chat model that deduplicates identical concurrent
+    `invoke` / `ainvoke` calls: callers with the same (model, params, messages) hash
+    wait on one upstream request. Being a Runnable it composes like the model itself
+    (`prompt | llm`, chain helpers); streaming and anything model-specific
+    (`with_structured_output`, `bind_tools`, ...) are delegated to the wrapped model.
+    """
+
+    _flights = ThreadSingleFlight()
+    _async_flights = SingleFlight()
+
+    def __init__(self, llm, model_name: str, params: dict):
+        self._llm = llm
+        self._model_name = model_name
+        self._params = params
+
+    def _key(self, messages, config, kwargs):
+        # callbacks/tags in config do not change the answer; call-time kwargs (stop, ...) may
+        if kwargs or (config or {}).get("configurable"):
+            return None
+        try:
+            return make_cache_key(self._model_name, _messages_fingerprint(messages), self._params)
+        except Exception:
+            return None
+
+    def invoke(self, input, config=None, **kwargs):
+        key = self._key(input, config, kwargs)
+        if key is None:
+            return self._llm.invoke(input, config, **kwargs)
+        return self._flights.do(key, lambda: self._llm.invoke(input, config))
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        key = self._key(input, config, kwargs)
+        if key is None:
+            return await self._llm.ainvoke(input, config, **kwargs)
+        return await self._async_flights.do(key, lambda: self._llm.ainvoke(input, config))
+
+    def stream(self, input, config=None, **kwargs):
+        return self._llm.stream(input, config, **kwargs)
+
+    def astream(self, input, config=None, **kwargs):
+        return self._llm.astream(input, config, **kwargs)
+
+    @property
+    def InputType(self):
+        return self._llm.InputType
+
+    @property
+    def OutputType(self):
+        return self._llm.OutputType
+
+    def get_input_schema(self, config=None):
+        return self._llm.get_input_schema(config)
+
+    def get_output_schema(self, config=None):
+        return self._llm.get_output_schema(config)
+
+    def get_name(self, suffix=None, *, name=None):
+        return self._llm.get_name(suffix, name=name)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._llm, name)
+
 class ModelLoader:
     """A Utility Class for Loading the Embedding Models and LLM Models"""
     def __init__(self):
@@ -31,8 +119,13 @@ class ModelLoader:
         """Load and Return the Embedding Model"""
         try:
             log.info("Loading embedding model.....")
-            model_name = self.config["embedding_model"]["model_name"]
-            return GoogleGenerativeAIEmbeddings(model = model_name)
+            embedding_config = self.config["embedding_model"]
+            model_name = embedding_config["model_name"]
+            embeddings = GoogleGenerativeAIEmbeddings(model = model_name)
+            cache_dir = os.getenv("EMBEDDING_CACHE_DIR", embedding_config.get("cache_dir"))
+            if cache_dir:
+                return CachedEmbeddings(embeddings, model_name, get_embedding_store(cache_dir))
+            return embeddings
         except Exception as e:
             log.error("Error loading embedding model", error = str(e))
             raise DocumentPortalException("Failed to load embedding model", sys)
@@ -56,20 +149,22 @@ class ModelLoader:
 
         log.info("Loading LLM", provider = provider, model = model_name, temperature = temperature, max_tokens = max_tokens)
 
+        params = {"provider": provider, "temperature": temperature, "max_output_tokens": max_tokens}
+
         if provider == "google":
             llm = ChatGoogleGenerativeAI(
                 model = model_name,  # Will use gemini-2.0-flash-exp
                 temperature = temperature,
                 max_output_tokens = max_tokens
             )
-            return llm
+            return CoalescedLLM(llm, model_name, params)
         
         elif provider == "groq":
             llm = ChatGroq(
                 model = model_name,
                 temperature=temperature
             )
-            return llm
+            return CoalescedLLM(llm, model_name, params)
         # elif provider == "openai":
         #     return ChatOpenAI(
         #         model=model_name,
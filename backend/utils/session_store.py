@@ -0,0 +1,211 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from logger.custom_logger import CustomLogger
+
+log = CustomLogger().get_logger(__name__)
+
+Turn = Dict[str, str]  # {"role": "user" | "assistant" | "summary", "content": str}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token); good enough for budgeting."""
+    return max(1, len(text or "") // 4)
+
+
+def _extractive_summary(turns: List[Turn], max_chars: int = 400) -> str:
+    """Fold dropped turns into one line: the first sentence of each earlier user message."""
+    points = []
+    for turn in turns:
+        if turn.get("role") == "summary":
+            points.append(turn.get("content", ""))
+        elif turn.get("role") == "user":
+            points.append((turn.get("content", "").split(".")[0]).strip())
+    summary = "; ".join(p for p in points if p)
+    return summary[:max_chars]
+
+
+def compact_history(
+    history: List[Turn],
+    token_budget: int,
+    summarizer: Optional[Callable[[List[Turn]], str]] = None,
+) -> List[Turn]:
+    """
+    Keep the most recent turns that fit in `token_budget`; anything older is
+    collapsed into a single leading "summary" turn (or dropped when it would
+    not fit either).
+    """
+    if sum(estimate_tokens(t.get("content", "")) for t in history) <= token_budget:
+        return history
+
+    kept: List[Turn] = []
+    used = 0
+    for turn in reversed(history):
+        cost = estimate_tokens(turn.get("content", ""))
+        if used + cost > token_budget:
+            break
+        kept.append(turn)
+        used += cost
+    kept.reverse()
+
+    dropped = history[: len(history) - len(kept)]
+    summarize = summarizer or _extractive_summary
+    summary = summarize(dropped)
+    # make room for the summary by folding the oldest kept turns into it
+    while summary and kept and used + estimate_tokens(summary) > token_budget:
+        turn = kept.pop(0)
+        used -= estimate_tokens(turn.get("content", ""))
+        dropped.append(turn)
+        summary = summarize(dropped)
+    if summary and used + estimate_tokens(summary) <= token_budget:
+        kept.insert(0, {"role": "summary", "content": summary})
+    return kept
+
+
+class SessionStore(ABC):
+    """Interface for chat session history storage."""
+
+    @abstractmethod
+    async def get_history(self, session_id: str) -> List[Turn]:
+        ...
+
+    @abstractmethod
+    async def append(self, session_id: str, *turns: Turn):
+        ...
+
+    @abstractmethod
+    async def delete(self, session_id: str):
+        ...
+
+    def stats(self) -> Dict[str, int]:
+        return {}
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Per-process LRU + TTL session store.
+    Bounded by session count and by the total characters held across all histories,
+    so memory stays flat no matter how many sessions are created.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 10000,
+        max_chars: int = 20_000_000,
+        ttl: float = 3600.0,
+        token_budget: int = 1000,
+    ):
+        self.max_sessions = max_sessions
+        self.max_chars = max_chars
+        self.ttl = ttl
+        self.token_budget = token_budget
+        # session_id -> (expires_at, history, chars)
+        self._sessions: "OrderedDict[str, tuple[float, List[Turn], int]]" = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _drop(self, session_id: str):
+        _, _, chars = self._sessions.pop(session_id)
+        self._chars -= chars
+
+    async def get_history(self, session_id: str) -> List[Turn]:
+        with self._lock:
+            item = self._sessions.get(session_id)
+            if item is None:
+                return []
+            if item[0] < time.monotonic():
+                self._drop(session_id)
+                return []
+            self._sessions.move_to_end(session_id)
+            return list(item[1])
+
+    async def append(self, session_id: str, *turns: Turn):
+        with self._lock:
+            history: List[Turn] = []
+            if session_id in self._sessions:
+                expires_at, history, _ = self._sessions[session_id]
+                if expires_at < time.monotonic():
+                    history = []
+                self._drop(session_id)
+            history = compact_history(history + list(turns), self.token_budget)
+            chars = sum(len(t.get("content", "")) for t in history)
+            self._sessions[session_id] = (time.monotonic() + self.ttl, history, chars)
+            self._chars += chars
+            while self._sessions and (
+                len(self._sessions) > self.max_sessions or self._chars > self.max_chars
+            ):
+                oldest = next(iter(self._sessions))
+                self._drop(oldest)
+                self.evictions += 1
+
+    async def delete(self, session_id: str):
+        with self._lock:
+            if session_id in self._sessions:
+                self._drop(session_id)
+
+    def stats(self) -> Dict[str, int]:
+        return {"sessions": len(self._sessions), "chars": self._chars, "evictions": self.evictions}
+
+
+class MongoSessionStore(SessionStore):
+    """
+    Session store shared by all workers, kept in the `chat_sessions` collection.
+    Appends are a single atomic $push bounded by $slice; a TTL index on
+    `updated_at` expires idle sessions. Histories are compacted to the token budget on read.
+    """
+
+    def __init__(
+        self,
+        collection_name: str = "chat_sessions",
+        ttl: float = 3600.0,
+        max_turns: int = 40,
+        token_budget: int = 1000,
+    ):
+        self.collection_name = collection_name
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self._indexed = False
+
+    async def _collection(self):
+        from db import get_collection
+        coll = await get_collection(self.collection_name)
+        if not self._indexed:
+            await coll.create_index("updated_at", expireAfterSeconds=int(self.ttl))
+            self._indexed = True
+        return coll
+
+    async def get_history(self, session_id: str) -> List[Turn]:
+        coll = await self._collection()
+        doc = await coll.find_one({"_id": session_id}, {"history": 1})
+        if not doc:
+            return []
+        return compact_history(doc.get("history", []), self.token_budget)
+
+    async def append(self, session_id: str, *turns: Turn):
+        coll = await self._collection()
+        await coll.update_one(
+            {"_id": session_id},
+            {
+                "$push": {"history": {"$each": list(turns), "$slice": -self.max_turns}},
+                "$set": {"updated_at": datetime.now(timezone.utc)},
+            },
+            upsert=True,
+        )
+
+    async def delete(self, session_id: str):
+        coll = await self._collection()
+        await coll.delete_one({"_id": session_id})
+
+
+def build_session_store(backend: str = "memory", **kwargs) -> SessionStore:
+    """Return the configured session store ("memory" or "mongo")."""
+    if backend == "mongo":
+        log.info("Using MongoDB chat session store")
+        return MongoSessionStore(**kwargs)
+    return InMemorySessionStore(**kwargs)